@@ -0,0 +1,66 @@
+"""
+Compara o tempo de carregamento da planilha sem cache (leitura do xlsx) e com o cache colunar.
+
+Uso:
+    python benchmarks/bench_cache_planilha.py --linhas 10000 50000 --saida resultados_cache.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_planilha import caminho_cache
+from planilha_sintetica import salvar_planilha
+from version_tree import DataHandler
+
+
+def medir_carregamento(file_path, sheet_name, repeticoes):
+    """Retorna o menor tempo de carregamento do DataHandler em segundos."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        DataHandler(file_path, sheet_name)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carregamento frio x quente da planilha.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 50_000])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', help="Arquivo JSON onde os resultados serão gravados.")
+    args = parser.parse_args(argv)
+
+    sheet_name = 'Planilha1'
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.linhas:
+            file_path = os.path.join(pasta, f"sintetica_{linhas}.xlsx")
+            salvar_planilha(file_path, linhas, sheet_name)
+            cache_path = caminho_cache(file_path, sheet_name)
+
+            frio = []
+            for _ in range(args.repeticoes):
+                cache_path.unlink(missing_ok=True)
+                frio.append(medir_carregamento(file_path, sheet_name, 1))
+            quente = medir_carregamento(file_path, sheet_name, args.repeticoes)
+
+            resultado = {'linhas': linhas, 'frio_s': round(min(frio), 4), 'quente_s': round(quente, 4)}
+            resultado['aceleracao'] = round(resultado['frio_s'] / max(resultado['quente_s'], 1e-9), 1)
+            resultados.append(resultado)
+            print(f"{linhas:>8} linhas: frio {resultado['frio_s']:.3f}s, quente {resultado['quente_s']:.3f}s "
+                  f"({resultado['aceleracao']}x)")
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Benchmark dos caminhos críticos do DataHandler em planilhas sintéticas grandes.
+
+Mede carregamento (frio e quente), normalização das colunas do modelo em memória, get_value e
+update_value por célula, save completo e checkpoint (cache Arrow), com o pico de memória de cada
+etapa. Compara com um baseline salvo e termina com código 1 se alguma métrica piorar além da
+tolerância. O pico de memória é medido com tracemalloc numa segunda execução de cada etapa, para
+não distorcer os tempos, que só devem ser comparados com baselines gerados na mesma máquina.
+
+Uso:
+    python benchmarks/bench_data_handler.py --linhas 10000 50000 200000
+    python benchmarks/bench_data_handler.py --atualizar-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_planilha import caminho_cache, salvar_cache
+from modelo_linhas import TabelaLinhas
+from planilha_sintetica import salvar_planilha
+from version_tree import DataHandler
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline_data_handler.json'
+SHEET_NAME = 'Planilha1'
+# Colunas lidas a cada linha pelo fluxo do portal
+COLUNAS_LIDAS = ['GUIA_COD', 'CARTEIRINHA', 'PACIENTE', 'SALDOGUIA']
+# Colunas escritas a cada linha pelo fluxo do portal
+COLUNAS_ESCRITAS = [('CONFIRMACOES', 'Confirmado 01/12/2024; Não confirmado'), ('QT_CONFIRMADA', 1), ('ERRO', '')]
+
+
+def medir(funcao, memoria=True):
+    """Executa a função e retorna (resultado, segundos, pico de memória em MB)."""
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+    if not memoria:
+        return resultado, segundos, 0.0
+    tracemalloc.start()
+    resultado = funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico / (1024 * 1024)
+
+
+def medir_tamanho(file_path, linhas, acessos, memoria):
+    """Roda todas as etapas para uma planilha com o número de linhas informado."""
+    metricas = {}
+    salvar_planilha(file_path, linhas, SHEET_NAME)
+
+    def carregar_frio():
+        caminho_cache(file_path, SHEET_NAME).unlink(missing_ok=True)
+        return DataHandler(file_path, SHEET_NAME)
+
+    handler, segundos, pico = medir(carregar_frio, memoria)
+    metricas['load_frio_s'], metricas['load_frio_mb'] = segundos, pico
+
+    handler, segundos, pico = medir(lambda: DataHandler(file_path, SHEET_NAME), memoria)
+    metricas['load_quente_s'], metricas['load_quente_mb'] = segundos, pico
+
+    # As colunas do modelo são normalizadas no primeiro acesso; medidas à parte, numa tabela nova a cada
+    # execução (a de memória encontraria as colunas prontas), para não distorcer get/update
+    _, segundos, pico = medir(lambda: TabelaLinhas(handler.df).preparar_colunas(), memoria)
+    metricas['colunas_s'], metricas['colunas_mb'] = segundos, pico
+    handler.linhas.preparar_colunas()
+
+    # Acessos espalhados pela planilha inteira, como numa execução completa
+    passo = max(linhas // acessos, 1)
+    indices = list(range(0, linhas, passo))[:acessos]
+
+    def ler():
+        for idx in indices:
+            for coluna in COLUNAS_LIDAS:
+                handler.get_value(idx, coluna)
+
+    _, segundos, pico = medir(ler, memoria)
+    metricas['get_value_us'] = segundos / (len(indices) * len(COLUNAS_LIDAS)) * 1e6
+    metricas['get_value_mb'] = pico
+
+    def escrever():
+        for idx in indices:
+            for coluna, valor in COLUNAS_ESCRITAS:
+                handler.update_value(idx, coluna, valor)
+
+    _, segundos, pico = medir(escrever, memoria)
+    metricas['update_value_us'] = segundos / (len(indices) * len(COLUNAS_ESCRITAS)) * 1e6
+    metricas['update_value_mb'] = pico
+
+    _, segundos, pico = medir(handler.save, memoria)
+    metricas['save_s'], metricas['save_mb'] = segundos, pico
+
+    _, segundos, pico = medir(lambda: salvar_cache(handler.df, file_path, SHEET_NAME), memoria)
+    metricas['checkpoint_s'], metricas['checkpoint_mb'] = segundos, pico
+
+    return {nome: round(valor, 4) for nome, valor in metricas.items()}
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Retorna a lista de regressões em relação ao baseline."""
+    regressoes = []
+    for linhas, metricas in resultados.items():
+        referencia = baseline.get(linhas)
+        if referencia is None:
+            continue
+        for nome, valor in metricas.items():
+            anterior = referencia.get(nome)
+            # Ignora métricas não medidas ou muito pequenas, dominadas por ruído
+            if not anterior or not valor or anterior < 0.01:
+                continue
+            if valor > anterior * (1 + tolerancia):
+                regressoes.append(f"{linhas} linhas, {nome}: {anterior} -> {valor} (+{(valor / anterior - 1) * 100:.0f}%)")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos críticos do DataHandler.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 50_000])
+    parser.add_argument('--acessos', type=int, default=2_000, help="Linhas acessadas por get/update.")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="Piora aceita antes de acusar regressão.")
+    parser.add_argument('--sem-memoria', action='store_true', help="Não mede o pico de memória (mais rápido).")
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--atualizar-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    # O log por célula do update_value não interessa aqui
+    logging.disable(logging.INFO)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.linhas:
+            file_path = os.path.join(pasta, f"sintetica_{linhas}.xlsx")
+            resultados[str(linhas)] = medir_tamanho(file_path, linhas, args.acessos, not args.sem_memoria)
+            print(f"{linhas:>8} linhas: " + ", ".join(f"{k}={v}" for k, v in resultados[str(linhas)].items()))
+
+    baseline_path = Path(args.baseline)
+    if args.atualizar_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8')) if baseline_path.exists() else {}
+        baseline.update(resultados)
+        baseline_path.write_text(json.dumps(baseline, indent=2) + '\n', encoding='utf-8')
+        print(f"Baseline atualizado em '{baseline_path}'.")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"Nenhum baseline em '{baseline_path}'. Rode com --atualizar-baseline para criá-lo.")
+        return 0
+
+    regressoes = comparar(resultados, json.loads(baseline_path.read_text(encoding='utf-8')), args.tolerancia)
+    for regressao in regressoes:
+        print(f"REGRESSÃO: {regressao}")
+    if not regressoes:
+        print("Nenhuma regressão em relação ao baseline.")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+
+def gerar_planilha(linhas, seed=0):
+    """Gera um DataFrame sintético com o mesmo esquema de Base_confirmação.xlsx."""
+    rng = np.random.default_rng(seed)
+    guias = rng.integers(7_000_000, 9_000_000, size=linhas)
+    pacientes = rng.integers(0, max(linhas // 4, 1), size=linhas)
+    datas = pd.Timestamp('2024-09-01') + pd.to_timedelta(rng.integers(0, 90, size=linhas), unit='D')
+    solicitado = rng.integers(1, 12, size=linhas)
+    realizado = rng.integers(0, 12, size=linhas) % (solicitado + 1)
+    return pd.DataFrame({
+        'PACIENTE': [f"PACIENTE SINTETICO {p:06d}" for p in pacientes],
+        'GUIA_COD': guias,
+        'SENHA': guias.astype(float) * 1000 + rng.integers(0, 1000, size=linhas),
+        'STATUS': 'Autorizado',
+        'DATASOLICIT': datas,
+        'DATAAUT': datas,
+        'PROCEDIMENTO': rng.choice([11185, 11193, 50001221, 20103093], size=linhas),
+        'SOLICITADO': solicitado,
+        'QTDE_AUT': solicitado,
+        'ID_PACIENTE': pacientes.astype(float),
+        'REALIZADO': realizado,
+        'SALDOGUIA': solicitado - realizado,
+        'CARTEIRINHA': 667_000_000 + pacientes,
+    })
+
+
+def salvar_planilha(path, linhas, sheet_name='Planilha1', seed=0):
+    """Grava a planilha sintética em xlsx e retorna o DataFrame gerado."""
+    df = gerar_planilha(linhas, seed=seed)
+    df.to_excel(path, sheet_name=sheet_name, index=False)
+    return df
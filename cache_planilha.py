@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # O cache é apenas uma otimização, sem pyarrow a planilha é lida normalmente
+    pa = None
+
+# Chave dos metadados gravados no esquema Arrow
+CHAVE_METADADOS = b'cache_planilha'
+# Colunas preenchidas pela automação e o tipo fixo de cada uma, igual na leitura do xlsx e do cache
+COLUNAS_RESULTADO_TEXTO = ('CONFIRMACOES', 'ERRO')
+COLUNAS_RESULTADO_INTEIRO = ('QT_CONFIRMADA',)
+
+
+def caminho_cache(file_path, sheet_name):
+    """Caminho do arquivo de cache ao lado da planilha, um por aba."""
+    file_path = Path(file_path)
+    return file_path.with_name(f".{file_path.stem}.{sheet_name}.cache.arrow")
+
+
+def assinatura_planilha(file_path, sheet_name):
+    """Identifica a versão da planilha pelo caminho, aba, data de modificação e tamanho."""
+    stat = os.stat(file_path)
+    return {
+        'path': str(Path(file_path).resolve()),
+        'sheet': sheet_name,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    }
+
+
+def tipar_colunas_resultado(df):
+    """
+    Dá às colunas de resultado um tipo explícito, no próprio DataFrame: texto com nulo no lugar do vazio
+    (como o xlsx devolve uma célula vazia) e inteiro anulável (Int64). Sem isso a coluna fica com tipos
+    misturados e o cache a gravaria como texto, diferente do que a leitura do xlsx devolve.
+    """
+    for col in COLUNAS_RESULTADO_TEXTO:
+        if col in df.columns:
+            serie = df[col].astype(object)
+            vazio = serie.isna() | serie.isin(['', ' '])
+            df[col] = serie.where(~vazio, None) if vazio.any() else serie
+    for col in COLUNAS_RESULTADO_INTEIRO:
+        if col in df.columns and df[col].dtype != 'Int64':
+            # Texto vazio ou inválido vira nulo
+            numeros = df[col] if pd.api.types.is_numeric_dtype(df[col]) else pd.to_numeric(df[col], errors='coerce')
+            df[col] = pd.array(np.trunc(numeros.to_numpy(dtype=float, na_value=np.nan)), dtype='Int64')
+    return df
+
+
+def _colunas_compativeis(df):
+    """Converte para texto as colunas com tipos misturados (ex.: '' e inteiros), que o Arrow não aceita."""
+    mistas = [
+        col for col in df.columns
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed')
+    ]
+    if not mistas:
+        return df
+    df = df.copy()
+    for col in mistas:
+        df[col] = df[col].map(lambda value: value if pd.isnull(value) else str(value))
+    return df
+
+
+def carregar_cache(file_path, sheet_name):
+    """Carrega o DataFrame do cache por memory map, ou retorna None se o cache não existir ou estiver desatualizado."""
+    if pa is None:
+        return None
+    cache_path = caminho_cache(file_path, sheet_name)
+    if not cache_path.exists():
+        return None
+    try:
+        with pa.memory_map(str(cache_path), 'r') as source:
+            leitor = pa.ipc.open_file(source)
+            metadados = (leitor.schema.metadata or {}).get(CHAVE_METADADOS)
+            if metadados is None or json.loads(metadados) != assinatura_planilha(file_path, sheet_name):
+                logging.info(f"Cache '{cache_path}' desatualizado, a planilha será relida.")
+                return None
+            df = leitor.read_all().to_pandas()
+        logging.info(f"Planilha carregada do cache '{cache_path}'.")
+        return df
+    except Exception as e:
+        logging.warning(f"Erro ao ler o cache '{cache_path}', a planilha será relida: {e}")
+        return None
+
+
+def salvar_cache(df, file_path, sheet_name):
+    """Grava o DataFrame em formato Arrow, associado à versão atual da planilha."""
+    if pa is None:
+        return
+    cache_path = caminho_cache(file_path, sheet_name)
+    temporario = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        tabela = pa.Table.from_pandas(_colunas_compativeis(tipar_colunas_resultado(df.copy())), preserve_index=False)
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[CHAVE_METADADOS] = json.dumps(assinatura_planilha(file_path, sheet_name)).encode()
+        tabela = tabela.replace_schema_metadata(metadados)
+        with pa.OSFile(str(temporario), 'wb') as sink:
+            with pa.ipc.new_file(sink, tabela.schema) as writer:
+                writer.write_table(tabela)
+        os.replace(temporario, cache_path)
+    except Exception as e:
+        logging.warning(f"Não foi possível gravar o cache da planilha: {e}")
+        if temporario.exists():
+            temporario.unlink()
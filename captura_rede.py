@@ -0,0 +1,121 @@
+import json
+import logging
+import re
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+# Tipos de requisição do portal que interessam (chamadas de API do SPA)
+TIPOS_CAPTURADOS = {'XHR', 'Fetch'}
+# Segmentos de URL que variam por guia/sessão e são agrupados num único padrão
+_SEGMENTO_VARIAVEL = re.compile(r'^(\d+|[0-9a-fA-F-]{16,})$')
+
+
+def padrao_url(url):
+    """Reduz a URL a um padrão: sem query string e com ids numéricos trocados por {id}."""
+    partes = urlsplit(url)
+    segmentos = ['{id}' if _SEGMENTO_VARIAVEL.match(seg) else seg for seg in partes.path.split('/')]
+    return f"{partes.netloc}{'/'.join(segmentos)}"
+
+
+def _percentil(valores, fracao):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * fracao), len(valores) - 1)]
+
+
+class CapturaRede:
+    """
+    Interpreta o log de performance do Chrome (eventos Network do DevTools Protocol) e atribui
+    cada XHR à etapa e à linha da planilha em andamento quando ela foi disparada.
+    """
+
+    def __init__(self):
+        self.etapa = None
+        self.linha = None
+        self.pendentes = {}  # requestId -> dados da requisição ainda sem resposta completa
+        self.requisicoes = []
+
+    def marcar_etapa(self, entradas, etapa, linha):
+        """Atribui as entradas lidas desde a última marcação à etapa anterior e inicia a nova."""
+        self.processar(entradas)
+        self.etapa = etapa
+        self.linha = linha
+
+    def processar(self, entradas):
+        """Processa as entradas de driver.get_log('performance')."""
+        for entrada in entradas:
+            try:
+                mensagem = json.loads(entrada['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            metodo = mensagem.get('method', '')
+            params = mensagem.get('params', {})
+            request_id = params.get('requestId')
+
+            if metodo == 'Network.requestWillBeSent':
+                if params.get('type') not in TIPOS_CAPTURADOS:
+                    continue
+                self.pendentes[request_id] = {
+                    'etapa': self.etapa,
+                    'linha': self.linha,
+                    'metodo': params['request'].get('method'),
+                    'padrao': padrao_url(params['request']['url']),
+                    'inicio': params['timestamp'],
+                }
+            elif request_id not in self.pendentes:
+                continue
+            elif metodo == 'Network.responseReceived':
+                resposta = params['response']
+                timing = resposta.get('timing') or {}
+                requisicao = self.pendentes[request_id]
+                requisicao['status'] = resposta.get('status')
+                if timing:
+                    # Tempo até o primeiro byte, do envio da requisição ao recebimento dos cabeçalhos
+                    inicio_cabecalhos = timing.get('receiveHeadersStart', timing.get('receiveHeadersEnd', 0))
+                    requisicao['ttfb_ms'] = round(inicio_cabecalhos - timing.get('sendEnd', 0), 1)
+            elif metodo == 'Network.loadingFinished':
+                requisicao = self.pendentes.pop(request_id)
+                requisicao['bytes'] = int(params.get('encodedDataLength', 0))
+                requisicao['duracao_ms'] = round((params['timestamp'] - requisicao.pop('inicio')) * 1000, 1)
+                self.requisicoes.append(requisicao)
+            elif metodo == 'Network.loadingFailed':
+                requisicao = self.pendentes.pop(request_id)
+                requisicao['status'] = 'falhou'
+                requisicao['duracao_ms'] = round((params['timestamp'] - requisicao.pop('inicio')) * 1000, 1)
+                self.requisicoes.append(requisicao)
+
+    def relatorio(self, limite=15):
+        """Agrupa as requisições por etapa e padrão de URL, das mais lentas (p95) para as mais rápidas."""
+        grupos = defaultdict(list)
+        for requisicao in self.requisicoes:
+            grupos[(requisicao['etapa'], requisicao['metodo'], requisicao['padrao'])].append(requisicao)
+
+        linhas = []
+        for (etapa, metodo, padrao), requisicoes in grupos.items():
+            duracoes = [r['duracao_ms'] for r in requisicoes]
+            ttfbs = [r['ttfb_ms'] for r in requisicoes if 'ttfb_ms' in r]
+            linhas.append({
+                'etapa': etapa,
+                'metodo': metodo,
+                'padrao': padrao,
+                'quantidade': len(requisicoes),
+                'falhas': sum(1 for r in requisicoes if r.get('status') == 'falhou' or (r.get('status') or 0) >= 400),
+                'p50_ms': _percentil(duracoes, 0.5),
+                'p95_ms': _percentil(duracoes, 0.95),
+                'max_ms': max(duracoes),
+                'ttfb_medio_ms': round(sum(ttfbs) / len(ttfbs), 1) if ttfbs else None,
+                'bytes_total': sum(r.get('bytes', 0) for r in requisicoes),
+            })
+        linhas.sort(key=lambda linha: linha['p95_ms'], reverse=True)
+        return linhas[:limite]
+
+    def salvar_relatorio(self, path, limite=15):
+        """Grava o relatório agregado e as requisições individuais em JSON e registra as mais lentas no log."""
+        relatorio = self.relatorio(limite)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'endpoints_mais_lentos': relatorio, 'requisicoes': self.requisicoes}, f, ensure_ascii=False, indent=2)
+        logging.info(f"Relatório de rede salvo em '{path}' ({len(self.requisicoes)} requisições).")
+        for linha in relatorio:
+            logging.info(
+                f"[{linha['etapa']}] {linha['metodo']} {linha['padrao']}: {linha['quantidade']}x, "
+                f"p50 {linha['p50_ms']}ms, p95 {linha['p95_ms']}ms, TTFB médio {linha['ttfb_medio_ms']}ms"
+            )
@@ -0,0 +1,169 @@
+import logging
+import re
+import time
+import unicodedata
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Espera fixa usada antes do resolvedor, referência para o tempo economizado
+ESPERA_FIXA_ANTERIOR = 1.0
+
+
+def _digitos(texto):
+    return re.sub(r'\D', '', texto or '').lstrip('0')
+
+
+def _numeros(texto):
+    """
+    Números do texto da sugestão, ignorando a formatação (pontos, traços) e zeros à esquerda.
+    O texto é separado antes em " - " e em espaços, para que a carteira não se junte à data ou ao CPF seguinte.
+    """
+    trechos = re.split(r'\s+-\s+|\s+', texto or '')
+    return {_digitos(trecho) for trecho in trechos if re.search(r'\d', trecho)}
+
+
+def _nome_normalizado(texto):
+    """Nome sem acentos, em maiúsculas e com espaços simples, para comparar com o texto da sugestão."""
+    sem_acentos = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acentos.upper().split())
+
+
+def _contem_carteira(texto, carteira):
+    digitos_carteira = _digitos(carteira)
+    return bool(digitos_carteira) and digitos_carteira in _numeros(texto)
+
+
+def _contem_paciente(texto, paciente):
+    nome = _nome_normalizado(paciente)
+    return bool(nome) and nome in _nome_normalizado(texto)
+
+
+class BeneficiarioDivergente(Exception):
+    """Nenhuma sugestão do autocomplete corresponde à carteira ou ao paciente da planilha."""
+
+
+class ResolvedorCarteirinha:
+    """
+    Preenche o campo numeroDaCarteiraConfirmacao e escolhe no autocomplete a sugestão da carteira
+    (ou do paciente) esperada, em vez de esperar um tempo fixo e aceitar a primeira opção.
+    O beneficiário escolhido fica em cache por carteira durante a execução. O cache só poupa tempo quando o
+    campo ainda tem o valor da escolha anterior; se o portal limpou o campo, ele só desempata as sugestões.
+    """
+
+    def __init__(self, automacao, timeout_sugestoes=1.0):
+        self.automacao = automacao
+        self.driver = automacao.driver
+        # Não passa da espera fixa anterior: se a lista não for reconhecida, o teclado não fica mais lento que antes
+        self.timeout_sugestoes = timeout_sugestoes
+        self.cache = {}  # Carteira -> texto da sugestão escolhida
+        self.valores = {}  # Carteira -> valor deixado no campo pela sugestão escolhida
+        self.estatisticas = {'cache': 0, 'autocomplete': 0, 'teclado': 0, 'divergencias': 0}
+        self.tempo_economizado = 0.0  # Negativo quando o resolvedor foi mais lento que a espera fixa
+        self.aviso_lista = False  # O aviso de lista não reconhecida só é dado uma vez
+
+    def _contar(self, origem, economizado=0.0):
+        self.estatisticas[origem] += 1
+        self.tempo_economizado += economizado
+        metricas = self.automacao.metricas
+        if metricas is not None:
+            metricas.incrementar('ipasgo_carteira_resolucoes_total', origem=origem)
+            if economizado > 0:
+                metricas.incrementar('ipasgo_carteira_tempo_economizado_segundos_total', economizado)
+            elif economizado < 0:
+                metricas.incrementar('ipasgo_carteira_tempo_perdido_segundos_total', -economizado)
+
+    def _aguardar_sugestoes(self):
+        """Espera a lista de sugestões aparecer; retorna as opções visíveis (lista vazia se não aparecer)."""
+        localizadores = self.automacao.localizadores
+        try:
+            return WebDriverWait(
+                self.driver, self.timeout_sugestoes, poll_frequency=0.1,
+                ignored_exceptions=(StaleElementReferenceException,),
+            ).until(lambda driver: [op for op in localizadores.localizar_todos('sugestoes_carteira') if op.is_displayed()] or False)
+        except TimeoutException:
+            return []
+
+    def _escolher(self, opcoes, carteira, paciente):
+        """Sugestão do beneficiário já resolvido, ou a que contém a carteira, ou a que contém o nome do paciente."""
+        textos = [opcao.text.strip() for opcao in opcoes]
+        resolvido = self.cache.get(carteira)
+        if resolvido in textos:
+            return opcoes[textos.index(resolvido)], resolvido
+        for opcao, texto in zip(opcoes, textos):
+            if _contem_carteira(texto, carteira):
+                return opcao, texto
+        for opcao, texto in zip(opcoes, textos):
+            if _contem_paciente(texto, paciente):
+                return opcao, texto
+        return None, textos
+
+    def _divergente(self, carteira, paciente, detalhe):
+        """Conta a divergência e retorna a exceção a lançar."""
+        self.estatisticas['divergencias'] += 1
+        if self.automacao.metricas is not None:
+            self.automacao.metricas.incrementar('ipasgo_carteira_divergencias_total')
+        return BeneficiarioDivergente(
+            f"Beneficiário divergente: {detalhe} à carteira {carteira} ({paciente or 'paciente não informado'})"
+        )
+
+    def resolver(self, campo, carteira, paciente=''):
+        """Seleciona o beneficiário da carteira no campo. Lança BeneficiarioDivergente se nenhuma sugestão corresponder."""
+        inicio = time.monotonic()
+        resolvido = self.cache.get(carteira)
+        # O campo ainda tem o valor deixado pela sugestão escolhida na confirmação anterior da mesma carteira
+        valor_campo = (campo.get_attribute('value') or '').strip()
+        if resolvido and valor_campo and valor_campo == self.valores.get(carteira):
+            self._contar('cache', ESPERA_FIXA_ANTERIOR)
+            logging.info(f"Beneficiário da carteira {carteira} reaproveitado do cache: {resolvido}")
+            return resolvido
+
+        campo.clear()
+        campo.send_keys(carteira)
+        opcoes = self._aguardar_sugestoes()
+        if not opcoes:
+            # Lista não reconhecida: mantém a seleção pelo teclado usada antes do resolvedor
+            if not self.aviso_lista:
+                self.aviso_lista = True
+                logging.warning(
+                    f"Sugestões da carteira {carteira} não reconhecidas pelos seletores de 'sugestoes_carteira'; "
+                    f"selecionando a primeira opção pelo teclado (aviso dado uma única vez)."
+                )
+            else:
+                logging.debug(f"Sugestões da carteira {carteira} não encontradas; selecionando pelo teclado.")
+            campo.send_keys(Keys.ARROW_DOWN)
+            campo.send_keys(Keys.ENTER)
+            # Sem a lista não se sabe qual opção o teclado escolheu: confere o valor que ela deixou no campo
+            valor_campo = (campo.get_attribute('value') or '').strip()
+            if not (_contem_carteira(valor_campo, carteira) or _contem_paciente(valor_campo, paciente)):
+                raise self._divergente(carteira, paciente, f"a opção escolhida pelo teclado ('{valor_campo}') não corresponde")
+            # A espera pelas sugestões conta contra a espera fixa, mesmo quando foi mais longa que ela
+            self._contar('teclado', ESPERA_FIXA_ANTERIOR - (time.monotonic() - inicio))
+            return None
+
+        opcao, texto = self._escolher(opcoes, carteira, paciente)
+        if opcao is None:
+            sugestoes = texto
+            raise self._divergente(
+                carteira, paciente, f"nenhuma das {len(sugestoes)} sugestões ({'; '.join(sugestoes)}) corresponde"
+            )
+        opcao.click()
+        self.cache[carteira] = texto
+        self.valores[carteira] = (campo.get_attribute('value') or '').strip()
+        duracao = time.monotonic() - inicio
+        self._contar('autocomplete', ESPERA_FIXA_ANTERIOR - duracao)
+        logging.info(f"Beneficiário selecionado para a carteira {carteira} em {duracao:.2f}s: {texto}")
+        return texto
+
+    def relatorio(self):
+        """Registra no log as resoluções por origem, as divergências e o tempo economizado."""
+        if not any(self.estatisticas.values()):
+            return
+        logging.info(
+            f"Carteirinhas: {self.estatisticas['autocomplete']} pelo autocomplete, {self.estatisticas['cache']} do cache, "
+            f"{self.estatisticas['teclado']} pelo teclado, {self.estatisticas['divergencias']} divergências; "
+            f"{self.tempo_economizado:.1f}s economizados em relação à espera fixa (negativo se houve perda)."
+        )
+        if self.estatisticas['teclado'] and not self.estatisticas['autocomplete']:
+            logging.warning("A lista de sugestões da carteira nunca foi reconhecida; confira os seletores de 'sugestoes_carteira'.")
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+
+
+class LimitadorTaxa:
+    """Token bucket compartilhado entre as sessões para limitar as ações no portal (pesquisa, modal, confirmação)."""
+
+    def __init__(self, taxa, rajada=None):
+        self.taxa = float(taxa)  # Ações por segundo
+        self.capacidade = float(rajada or max(1.0, self.taxa))
+        self.tokens = self.capacidade
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def adquirir(self, acao=''):
+        """Bloqueia até haver um token disponível. Retorna o tempo esperado em segundos."""
+        with self.lock:
+            agora = time.monotonic()
+            self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+            self.ultimo = agora
+            # Reserva o token mesmo sem saldo; quem chega depois espera também pela reserva
+            self.tokens -= 1
+            espera = -self.tokens / self.taxa if self.tokens < 0 else 0.0
+        if espera > 0:
+            logging.debug(f"Limitador de taxa: aguardando {espera:.2f}s para '{acao}'.")
+            time.sleep(espera)
+        return espera
+
+
+class ControladorAIMD:
+    """
+    Ajusta o número de sessões ativas pela latência e pela taxa de erro observadas nas esperas do portal:
+    aumento aditivo (+1 sessão) quando tudo está saudável, redução multiplicativa (metade) quando não está.
+    """
+
+    def __init__(self, sessoes_max, sessoes_iniciais=1, janela=30, latencia_alvo=5.0, taxa_erro_max=0.15,
+                 limitador=None):
+        self.sessoes_max = sessoes_max
+        self.sessoes_ativas = max(1, min(sessoes_iniciais, sessoes_max))
+        self.janela = janela
+        self.latencia_alvo = latencia_alvo
+        self.taxa_erro_max = taxa_erro_max
+        self.limitador = limitador
+        self.observacoes = []
+        self.lock = threading.Lock()
+
+    def observar(self, latencia, falhou=False):
+        """Registra uma espera no portal (acessar_com_reattempt, safe_click) e decide ao completar a janela."""
+        with self.lock:
+            self.observacoes.append((latencia, falhou))
+            if len(self.observacoes) >= self.janela:
+                self._decidir()
+                self.observacoes = []
+
+    def _decidir(self):
+        latencias = sorted(latencia for latencia, _ in self.observacoes)
+        p95 = latencias[min(int(len(latencias) * 0.95), len(latencias) - 1)]
+        taxa_erro = sum(1 for _, falhou in self.observacoes if falhou) / len(self.observacoes)
+
+        anterior = self.sessoes_ativas
+        if taxa_erro > self.taxa_erro_max:
+            self.sessoes_ativas = max(1, anterior // 2)
+            motivo = f"taxa de erro {taxa_erro:.0%} acima de {self.taxa_erro_max:.0%}"
+        elif p95 > self.latencia_alvo:
+            self.sessoes_ativas = max(1, anterior // 2)
+            motivo = f"latência p95 {p95:.1f}s acima de {self.latencia_alvo:.1f}s"
+        else:
+            self.sessoes_ativas = min(self.sessoes_max, anterior + 1)
+            motivo = f"latência p95 {p95:.1f}s e taxa de erro {taxa_erro:.0%} dentro do limite"
+
+        taxa = f"{self.limitador.taxa:.2f} ações/s" if self.limitador else "sem limite"
+        logging.info(f"Concorrência: {anterior} -> {self.sessoes_ativas} sessões ativas ({motivo}; taxa {taxa}).")
+
+    def tem_vaga(self, numero_sessao):
+        """Indica se a sessão (numerada a partir de 0) pode processar a próxima linha."""
+        return numero_sessao < self.sessoes_ativas
+
+
+class TravasPorChave:
+    """Um lock por chave (GUIA_COD), criado sob demanda, para que duas sessões nunca trabalhem na mesma guia ao mesmo tempo."""
+
+    def __init__(self):
+        self.travas = {}
+        self.lock = threading.Lock()
+
+    def trava(self, chave):
+        """Lock da chave, usado com `with`."""
+        with self.lock:
+            return self.travas.setdefault(chave, threading.Lock())
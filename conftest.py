@@ -0,0 +1 @@
+# Coloca a raiz do repositório no sys.path para que os testes importem os módulos da automação
@@ -0,0 +1,120 @@
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+# Colunas que identificam uma linha entre exportações diferentes da planilha
+COLUNAS_CHAVE = ['GUIA_COD', 'PACIENTE', 'PROCEDIMENTO']
+# Colunas preenchidas pela automação (não entram no hash de conteúdo)
+COLUNAS_RESULTADO = ['CONFIRMACOES', 'ERRO', 'QT_CONFIRMADA', 'QT_REALIZADA']
+
+
+def normalizar_coluna(serie):
+    """Converte uma coluna para texto do mesmo jeito que DataHandler.get_value, de forma vetorizada."""
+    # Colunas object com apenas números (ex.: QT_CONFIRMADA) voltam a ser numéricas
+    serie = serie.infer_objects()
+    nulos = serie.isna()
+    if pd.api.types.is_float_dtype(serie):
+        valores = serie[~nulos]
+        if (valores % 1 == 0).all():
+            serie = serie.astype('Int64')
+    texto = serie.astype(str).str.strip()
+    texto[nulos] = ''
+    return texto
+
+
+def calcular_hashes(df):
+    """Retorna um DataFrame com a chave da linha e o hash do conteúdo de entrada, um por linha."""
+    colunas_entrada = [col for col in df.columns if col not in COLUNAS_RESULTADO]
+    colunas_chave = [col for col in COLUNAS_CHAVE if col in df.columns]
+    if not colunas_chave:
+        raise Exception(f"Nenhuma das colunas de chave {COLUNAS_CHAVE} foi encontrada na planilha.")
+
+    texto = pd.DataFrame({col: normalizar_coluna(df[col]) for col in colunas_entrada}, index=df.index)
+    chave = pd.util.hash_pandas_object(texto[colunas_chave], index=False)
+    # Linhas repetidas (mesma guia, paciente e procedimento) são diferenciadas pela ordem de aparição
+    ocorrencia = chave.groupby(chave.values).cumcount()
+
+    return pd.DataFrame({
+        'CHAVE': chave.values,
+        'OCORRENCIA': ocorrencia.values,
+        'HASH': pd.util.hash_pandas_object(texto, index=False).values,
+    }, index=df.index)
+
+
+def linhas_concluidas(df):
+    """Máscara das linhas já concluídas: confirmações capturadas, nenhuma pendente e sem erro."""
+    confirmacoes = normalizar_coluna(df['CONFIRMACOES'])
+    erro = normalizar_coluna(df['ERRO'])
+    return (confirmacoes != '') & ~confirmacoes.str.contains('Não confirmado', regex=False) & (erro == '')
+
+
+class DiferencialExecucao:
+    """Compara a planilha atual com o estado da execução anterior para processar só o que mudou."""
+
+    def __init__(self, estado_path):
+        self.estado_path = Path(estado_path)
+
+    def carregar_estado(self):
+        """Carrega o estado salvo pela execução anterior, se existir."""
+        if not self.estado_path.exists():
+            logging.info(f"Nenhum estado anterior encontrado em '{self.estado_path}'. Todas as linhas serão processadas.")
+            return None
+        try:
+            return pd.read_pickle(self.estado_path)
+        except Exception as e:
+            logging.error(f"Erro ao carregar o estado anterior, todas as linhas serão processadas: {e}")
+            return None
+
+    def planejar(self, data_handler):
+        """
+        Retorna os índices das linhas que precisam ser processadas.
+        Linhas inalteradas e concluídas na execução anterior recebem os resultados anteriores.
+        """
+        df = data_handler.df
+        atual = calcular_hashes(df)
+        anterior = self.carregar_estado()
+        if anterior is None:
+            return list(df.index)
+
+        anterior = anterior.rename(columns={
+            col: f'{col}_ANTERIOR' for col in anterior.columns if col not in ('CHAVE', 'OCORRENCIA')
+        })
+        # O merge à esquerda preserva a ordem das linhas atuais
+        comparacao = atual.merge(anterior, on=['CHAVE', 'OCORRENCIA'], how='left')
+        comparacao.index = df.index
+
+        inalteradas = comparacao['HASH'] == comparacao['HASH_ANTERIOR']
+        concluidas = comparacao['CONCLUIDA_ANTERIOR'].eq(True)
+        reaproveitar = inalteradas & concluidas
+
+        indices_reaproveitados = comparacao.index[reaproveitar]
+        for col in COLUNAS_RESULTADO:
+            if col not in df.columns:
+                continue
+            df[col] = df[col].astype(object)
+            df.loc[indices_reaproveitados, col] = comparacao.loc[reaproveitar, f'{col}_ANTERIOR'].values
+        # As linhas em memória precisam refletir os resultados copiados
+        data_handler.reload_rows()
+
+        pendentes = list(comparacao.index[~reaproveitar])
+        logging.info(
+            f"Modo diferencial: {len(df)} linhas, {int(comparacao['HASH_ANTERIOR'].isna().sum())} novas, "
+            f"{int((~inalteradas & comparacao['HASH_ANTERIOR'].notna()).sum())} alteradas, "
+            f"{len(indices_reaproveitados)} reaproveitadas, {len(pendentes)} na fila."
+        )
+        return pendentes
+
+    def salvar_estado(self, data_handler):
+        """Salva hash e resultados de cada linha para a próxima execução."""
+        try:
+            data_handler.flush_rows()
+            df = data_handler.df
+            estado = calcular_hashes(df)
+            for col in COLUNAS_RESULTADO:
+                estado[col] = df[col].astype(object) if col in df.columns else ''
+            estado['CONCLUIDA'] = linhas_concluidas(df)
+            estado.reset_index(drop=True).to_pickle(self.estado_path)
+            logging.info(f"Estado da execução salvo em '{self.estado_path}'.")
+        except Exception as e:
+            logging.error(f"Erro ao salvar o estado da execução: {e}")
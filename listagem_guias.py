@@ -0,0 +1,137 @@
+import logging
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import Select
+
+# Lê numa única chamada todas as guias da página e o status dos procedimentos exibidos em cada uma
+SCRIPT_EXTRAIR_PAGINA = """
+var raiz = document.getElementById('localizarprocedimentos');
+if (!raiz) { return []; }
+var numeros = raiz.querySelectorAll("[data-bind*='NumeroGuia']");
+var resultado = [];
+for (var i = 0; i < numeros.length; i++) {
+    var guia = (numeros[i].textContent || '').replace(/\\D/g, '');
+    if (!guia) { continue; }
+    // Sobe até o bloco da guia: o maior ancestral que ainda contém um único número de guia
+    var bloco = numeros[i];
+    while (bloco.parentElement && bloco.parentElement !== raiz &&
+           bloco.parentElement.querySelectorAll("[data-bind*='NumeroGuia']").length === 1) {
+        bloco = bloco.parentElement;
+    }
+    var status = [];
+    var spans = bloco.querySelectorAll("span[data-bind^='text: IsConfirmado()']");
+    for (var j = 0; j < spans.length; j++) { status.push(spans[j].textContent.trim()); }
+    resultado.push({guia: guia, status: status});
+}
+return resultado;
+"""
+
+
+class ListagemGuias:
+    """
+    Descoberta em lote: pesquisa a listagem de Localizar Procedimentos por período (e prestador),
+    percorre as páginas e lê o status de todas as guias de cada página de uma só vez.
+    """
+
+    def __init__(self, automacao, max_paginas=200):
+        self.automacao = automacao
+        self.driver = automacao.driver
+        self.max_paginas = max_paginas
+
+    def pesquisar(self, data_inicial, data_final, prestador=None):
+        """Preenche os filtros e dispara a pesquisa."""
+        for nome, valor in (('filtro_data_inicial', data_inicial), ('filtro_data_final', data_final)):
+            campo = self.automacao.acessar_com_reattempt(nome)
+            campo.clear()
+            campo.send_keys(valor)
+        if prestador:
+            Select(self.automacao.acessar_com_reattempt('filtro_prestador')).select_by_visible_text(prestador)
+        self.automacao.aguardar_taxa('pesquisa')
+        self.automacao.safe_click('botao_pesquisar_guia')
+
+    def limpar_filtros(self, prestador=None):
+        """Apaga o período e o prestador da listagem, que continuariam aplicados à pesquisa por guia."""
+        for nome in ('filtro_data_inicial', 'filtro_data_final'):
+            self.automacao.acessar_com_reattempt(nome).clear()
+        if prestador:
+            # A primeira opção do filtro é a de todos os prestadores
+            Select(self.automacao.acessar_com_reattempt('filtro_prestador')).select_by_index(0)
+
+    def _aguardar_pagina(self, anterior, timeout=20):
+        """Espera a lista mudar em relação à página anterior e retorna as guias da nova página."""
+        fim = time.monotonic() + timeout
+        while time.monotonic() < fim:
+            pagina = self.driver.execute_script(SCRIPT_EXTRAIR_PAGINA) or []
+            if pagina and pagina != anterior:
+                return pagina
+            time.sleep(0.5)
+        return None
+
+    def listar(self, data_inicial, data_final, prestador=None):
+        """Retorna um dicionário guia -> lista de status, com as guias de todas as páginas."""
+        inicio = time.monotonic()
+        self.automacao.marcar_etapa('listagem_guias')
+        self.pesquisar(data_inicial, data_final, prestador)
+
+        guias = {}
+        pagina = self._aguardar_pagina(None)
+        paginas = 0
+        while pagina:
+            paginas += 1
+            for item in pagina:
+                # A mesma guia pode aparecer em mais de um bloco; os status são somados
+                guias.setdefault(item['guia'], []).extend(item['status'])
+            if paginas >= self.max_paginas:
+                logging.warning(f"Listagem interrompida no limite de {self.max_paginas} páginas.")
+                break
+            # O link da próxima página fica desabilitado na última página sem sair da tela, então não vem do cache
+            self.automacao.localizadores.invalidar('proxima_pagina')
+            try:
+                proxima = self.automacao.localizadores.localizar('proxima_pagina', timeout=2)
+            except TimeoutException:
+                break  # Última página
+            self.automacao.aguardar_taxa('pesquisa')
+            proxima.click()
+            pagina = self._aguardar_pagina(pagina)
+
+        logging.info(
+            f"Listagem de {data_inicial} a {data_final}: {len(guias)} guias em {paginas} páginas "
+            f"({time.monotonic() - inicio:.1f}s)."
+        )
+        return guias
+
+
+def aplicar_listagem(automacao, guias_listadas, fila):
+    """
+    Casa as guias listadas com as linhas da fila pelo índice de GUIA_COD. Linhas de guias com todos os
+    procedimentos já confirmados recebem o resultado direto da listagem e saem da fila; as demais seguem
+    para o fluxo normal, que confirma o primeiro procedimento pendente. Retorna a nova fila.
+    """
+    data_handler = automacao.data_handler
+    indice = data_handler.linhas.indice_guias()
+    na_fila = set(fila)
+    resolvidas = set()
+    casadas = 0
+
+    for guia, status in guias_listadas.items():
+        linhas_guia = [idx for idx in indice.get(guia, ()) if idx in na_fila]
+        if not linhas_guia:
+            continue
+        casadas += 1
+        if not status or not all(texto.startswith('Confirmado') for texto in status):
+            continue
+        confirmacoes_texto = "; ".join(status)
+        for idx in linhas_guia:
+            data_handler.update_value(idx, 'CONFIRMACOES', confirmacoes_texto)
+            data_handler.update_value(idx, 'QT_CONFIRMADA', len(status))
+            resolvidas.add(idx)
+        # Um único registro por guia, com a primeira linha dela na planilha
+        automacao.registro.registrar(guia, linhas_guia[0] + 2, confirmacoes_texto, len(status))
+
+    guias_fila = {data_handler.linhas[idx].guia_cod for idx in fila}
+    logging.info(
+        f"Listagem casada com a planilha: {casadas} de {len(guias_fila)} guias da fila encontradas; "
+        f"{len(resolvidas)} linhas resolvidas sem pesquisa individual."
+    )
+    return [idx for idx in fila if idx not in resolvidas]
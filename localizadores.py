@@ -0,0 +1,188 @@
+import logging
+import time
+
+from selenium.common.exceptions import (
+    NoSuchElementException, StaleElementReferenceException, TimeoutException, WebDriverException,
+)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Cada alvo do portal definido uma única vez: seletor principal seguido dos alternativos
+LOCALIZADORES = {
+    # Login do Portal Dominio
+    'login_usuario': [(By.ID, "SilkUIFramework_wt13_block_wtUsername_wtUserNameInput2"),
+                      (By.CSS_SELECTOR, "input[id$='wtUserNameInput2']")],
+    'login_senha': [(By.ID, "SilkUIFramework_wt13_block_wtPassword_wtPasswordInput"),
+                    (By.CSS_SELECTOR, "input[id$='wtPasswordInput']")],
+    'login_botao': [(By.ID, "SilkUIFramework_wt13_block_wtAction_wtLoginButton"),
+                    (By.CSS_SELECTOR, "[id$='wtLoginButton']")],
+    # O prefixo gerado pelo OutSystems (wt16, wt36, wt9...) muda com o layout; o sufixo do módulo não
+    'link_webplan': [(By.CSS_SELECTOR, "[id$='wtModuloPortalTable_ctl04_wt2'] > span"),
+                     (By.XPATH, "//*[@id='IpasgoTheme_wt16_block_wtMainContent_wtSistemas_ctl08_SilkUIFramework_wt36_block_wtActions_wtModulos_SilkUIFramework_wt9_block_wtContent_wtModuloPortalTable_ctl04_wt2']/span")],
+    'alerta_login': [(By.ID, "button-1")],
+
+    # WebPlan / Localizar Procedimentos
+    'menu_principal': [(By.ID, "menuPrincipal")],
+    'menu_localizar_procedimentos': [(By.CSS_SELECTOR, ".localizar-procedimentos-icon")],
+    'campo_guia': [(By.CSS_SELECTOR, "div.input-group > input.form-control.small")],
+    'botao_pesquisar_guia': [(By.CSS_SELECTOR, "div.input-group span.fa-search.pointer"),
+                             (By.XPATH, "//div[contains(@class, 'input-group')]//span[contains(@class, 'fa-search') and contains(@class, 'pointer')]")],
+    'abrir_confirmacao': [(By.XPATH, "(//*[@id='localizarprocedimentos']/div[2]//div[count(i) >= 2]/i[2])[1]"),
+                          (By.XPATH, '//*[@id="localizarprocedimentos"]/div[2]/div/div[2]/div/div[2]/div[1]/div/div/div/div[2]/div[2]/div/div[1]/div/div[1]/div[2]/div/i[2]')],
+    'fechar_alerta_notificacao': [(By.CSS_SELECTOR, "i.fa-times.close"),
+                                  (By.XPATH, "//i[contains(@class, 'fa-times') and contains(@class, 'close')]")],
+
+    # Listagem em lote
+    'filtro_data_inicial': [(By.CSS_SELECTOR, "#localizarprocedimentos input[data-bind*='DataInicial']")],
+    'filtro_data_final': [(By.CSS_SELECTOR, "#localizarprocedimentos input[data-bind*='DataFinal']")],
+    'filtro_prestador': [(By.CSS_SELECTOR, "#localizarprocedimentos select[data-bind*='Prestador']")],
+    'proxima_pagina': [(By.XPATH, "//*[@id='localizarprocedimentos']//ul[contains(@class, 'pagination')]"
+                                  "/li[not(contains(@class, 'disabled'))]/a[contains(., 'Próxima') or @aria-label='Next' or normalize-space(.)='»']")],
+
+    # Modal de confirmação
+    'modal_confirmacao': [(By.ID, "confirmar-procedimentos-modal")],
+    # Um item por procedimento: o filho do foreach do Knockout com um único status
+    'itens_confirmacao': [(By.XPATH, '//*[@id="confirmar-procedimentos-modal"]/div/div/div[2]/div[2]/div/div[2]/div/div'),
+                          (By.XPATH, "//*[@id='confirmar-procedimentos-modal']//*[contains(@data-bind, 'foreach')]"
+                                     "/div[count(.//span[starts-with(@data-bind, 'text: IsConfirmado()')]) = 1]")],
+    'campo_carteira': [(By.ID, "numeroDaCarteiraConfirmacao")],
+    # Sugestões do autocomplete da carteira (jQuery UI, typeahead ou listbox acessível)
+    'sugestoes_carteira': [(By.CSS_SELECTOR, "ul.ui-autocomplete li.ui-menu-item"),
+                           (By.CSS_SELECTOR, "ul.typeahead li, .tt-menu .tt-suggestion"),
+                           (By.CSS_SELECTOR, "[role='listbox'] [role='option']")],
+    'botao_confirmar_identificacao': [(By.XPATH, '//*[@id="indentificar-confirmar-procedimentos-modal"]/div/div/div[3]/div/button[2]'),
+                                      (By.CSS_SELECTOR, "#indentificar-confirmar-procedimentos-modal .modal-footer button:nth-of-type(2)")],
+}
+
+
+class RegistroLocalizadores:
+    """
+    Resolve os alvos de LOCALIZADORES pelo nome, tentando o seletor principal e depois os alternativos.
+    Os elementos resolvidos ficam em cache por aba enquanto continuarem válidos na tela; um elemento
+    obsoleto (StaleElementReferenceException) ou oculto é resolvido de novo automaticamente.
+    """
+
+    def __init__(self, driver, localizadores=LOCALIZADORES):
+        self.driver = driver
+        self.localizadores = localizadores
+        self.cache = {}  # (aba, nome) -> WebElement
+        self.estatisticas = {}  # nome -> contadores e tempo de resolução
+
+    def _estatistica(self, nome):
+        if nome not in self.estatisticas:
+            self.estatisticas[nome] = {'resolucoes': 0, 'cache': 0, 'alternativo': 0, 'falhas': 0, 'tempo': 0.0}
+        return self.estatisticas[nome]
+
+    def _aba(self):
+        try:
+            return self.driver.current_window_handle
+        except WebDriverException:
+            return None
+
+    def _valido(self, elemento, condicao):
+        """Confere se o elemento em cache ainda está na tela e atende a condição."""
+        try:
+            if not elemento.is_displayed():
+                return False
+            return condicao is not EC.element_to_be_clickable or elemento.is_enabled()
+        except StaleElementReferenceException:
+            return False
+
+    def localizar(self, nome, condicao=EC.element_to_be_clickable, timeout=10):
+        """Retorna o elemento do alvo, do cache ou resolvido; lança TimeoutException se nenhum seletor o encontrar."""
+        chave = (self._aba(), nome)
+        estatistica = self._estatistica(nome)
+        elemento = self.cache.get(chave)
+        if elemento is not None and self._valido(elemento, condicao):
+            estatistica['cache'] += 1
+            return elemento
+
+        inicio = time.monotonic()
+        seletores = self.localizadores[nome]
+
+        def algum_seletor(driver):
+            # Todos os seletores são conferidos a cada verificação, o principal primeiro: um alternativo
+            # não espera o tempo todo do principal, e o principal ainda vence quando os dois estão na tela
+            for posicao, seletor in enumerate(seletores):
+                try:
+                    elemento = condicao(seletor)(driver)
+                except (NoSuchElementException, StaleElementReferenceException):
+                    continue
+                if elemento:
+                    return posicao, seletor, elemento
+            return False
+
+        try:
+            try:
+                posicao, seletor, elemento = WebDriverWait(self.driver, timeout).until(algum_seletor)
+            except TimeoutException:
+                estatistica['falhas'] += 1
+                raise TimeoutException(f"Localizador '{nome}' não encontrado por nenhum dos {len(seletores)} seletores.")
+            if posicao > 0:
+                estatistica['alternativo'] += 1
+                logging.warning(f"Localizador '{nome}' resolvido pelo seletor alternativo {seletor}.")
+            self.cache[chave] = elemento
+            return elemento
+        finally:
+            estatistica['resolucoes'] += 1
+            estatistica['tempo'] += time.monotonic() - inicio
+
+    def procurar(self, nome):
+        """Como localizar, mas sem esperar: retorna o primeiro elemento visível ou None."""
+        chave = (self._aba(), nome)
+        elemento = self.cache.get(chave)
+        if elemento is not None and self._valido(elemento, None):
+            self._estatistica(nome)['cache'] += 1
+            return elemento
+        for seletor in self.localizadores[nome]:
+            for elemento in self.driver.find_elements(*seletor):
+                try:
+                    if elemento.is_displayed():
+                        self.cache[chave] = elemento
+                        return elemento
+                except StaleElementReferenceException:
+                    continue
+        return None
+
+    def localizar_todos(self, nome, contexto=None):
+        """Todos os elementos do primeiro seletor que encontrar algum (sem cache, a lista muda a cada tela)."""
+        contexto = contexto or self.driver
+        inicio = time.monotonic()
+        estatistica = self._estatistica(nome)
+        try:
+            for posicao, seletor in enumerate(self.localizadores[nome]):
+                elementos = contexto.find_elements(*seletor)
+                if elementos:
+                    if posicao > 0:
+                        estatistica['alternativo'] += 1
+                    return elementos
+            return []
+        finally:
+            estatistica['resolucoes'] += 1
+            estatistica['tempo'] += time.monotonic() - inicio
+
+    def executar(self, nome, acao, condicao=EC.element_to_be_clickable, timeout=10):
+        """Executa acao(elemento); se o elemento ficar obsoleto no meio, resolve de novo e repete uma vez."""
+        try:
+            return acao(self.localizar(nome, condicao, timeout))
+        except StaleElementReferenceException:
+            logging.info(f"Elemento '{nome}' obsoleto, resolvendo novamente.")
+            self.invalidar(nome)
+            return acao(self.localizar(nome, condicao, timeout))
+
+    def invalidar(self, nome=None):
+        """Descarta do cache um alvo (em todas as abas) ou, sem nome, todos, por exemplo ao trocar de tela."""
+        for chave in list(self.cache):
+            if nome is None or chave[1] == nome:
+                del self.cache[chave]
+
+    def relatorio(self):
+        """Registra no log o tempo de resolução de cada localizador."""
+        for nome, estatistica in sorted(self.estatisticas.items(), key=lambda item: item[1]['tempo'], reverse=True):
+            resolucoes = estatistica['resolucoes']
+            media_ms = estatistica['tempo'] / resolucoes * 1000 if resolucoes else 0.0
+            logging.info(
+                f"Localizador '{nome}': {resolucoes} resoluções (média {media_ms:.0f}ms), "
+                f"{estatistica['cache']} do cache, {estatistica['alternativo']} pelo alternativo, {estatistica['falhas']} falhas."
+            )
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+except ImportError:  # Sem psutil a memória do navegador não é exportada
+    psutil = None
+
+# Limites (em segundos) dos histogramas de latência
+BUCKETS_PADRAO = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+DESCRICOES = {
+    'ipasgo_linhas_total': ('counter', "Tentativas de linhas da planilha por resultado (processada, erro, pulada, listagem)."),
+    'ipasgo_guias_confirmadas_total': ('counter', "Procedimentos confirmados no portal."),
+    'ipasgo_retentativas_total': ('counter', "Tentativas repetidas de acesso ou clique em elementos do portal."),
+    'ipasgo_linhas_reagendadas_total': ('counter', "Linhas com erro devolvidas à fila de retentativas."),
+    'ipasgo_carteira_resolucoes_total': ('counter', "Beneficiários selecionados por origem (autocomplete, cache, teclado)."),
+    'ipasgo_carteira_divergencias_total': ('counter', "Carteiras sem sugestão correspondente no autocomplete."),
+    'ipasgo_carteira_tempo_economizado_segundos_total': ('counter', "Tempo economizado em relação à espera fixa do autocomplete."),
+    'ipasgo_carteira_tempo_perdido_segundos_total': ('counter', "Tempo gasto além da espera fixa do autocomplete."),
+    'ipasgo_etapa_duracao_segundos': ('histogram', "Duração de cada etapa do fluxo de uma linha."),
+    'ipasgo_linha_duracao_segundos': ('histogram', "Duração do processamento completo de uma linha."),
+    'ipasgo_navegador_rss_bytes': ('gauge', "Memória residente do chromedriver e do Chrome de cada sessão."),
+    'ipasgo_sessoes_ativas': ('gauge', "Sessões do navegador ativas."),
+    'ipasgo_linhas_restantes': ('gauge', "Linhas ainda na fila."),
+    'ipasgo_tempo_restante_estimado_segundos': ('gauge', "Tempo restante estimado pelo ritmo das últimas linhas."),
+}
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{chave}="{valor}"' for chave, valor in rotulos) + '}'
+
+
+def rss_navegador(driver):
+    """Memória residente do chromedriver e de todos os processos do Chrome abertos por ele, em bytes."""
+    if psutil is None:
+        return None
+    try:
+        processo = psutil.Process(driver.service.process.pid)
+        return sum(p.memory_info().rss for p in [processo] + processo.children(recursive=True))
+    except Exception:
+        return None
+
+
+class Metricas:
+    """Contadores, gauges e histogramas da execução, exportados no formato de texto do Prometheus."""
+
+    def __init__(self, janela_eta=50):
+        self.lock = threading.Lock()
+        self.contadores = defaultdict(float)
+        self.gauges = {}
+        self.histogramas = {}
+        self.restantes = 0
+        # Horários de conclusão das últimas linhas, para estimar o ritmo (já considera várias sessões)
+        self.conclusoes = deque(maxlen=janela_eta)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        with self.lock:
+            self.contadores[(nome, tuple(sorted(rotulos.items())))] += valor
+
+    def definir(self, nome, valor, **rotulos):
+        with self.lock:
+            self.gauges[(nome, tuple(sorted(rotulos.items())))] = valor
+
+    def observar(self, nome, valor, **rotulos):
+        with self.lock:
+            chave = (nome, tuple(sorted(rotulos.items())))
+            if chave not in self.histogramas:
+                self.histogramas[chave] = {'buckets': [0] * len(BUCKETS_PADRAO), 'soma': 0.0, 'quantidade': 0}
+            histograma = self.histogramas[chave]
+            for posicao, limite in enumerate(BUCKETS_PADRAO):
+                if valor <= limite:
+                    histograma['buckets'][posicao] += 1
+            histograma['soma'] += valor
+            histograma['quantidade'] += 1
+
+    def iniciar(self, na_fila, puladas):
+        """Registra o tamanho da fila e as linhas que o modo diferencial ou o shard deixaram de fora."""
+        self.incrementar('ipasgo_linhas_total', puladas, resultado='pulada')
+        with self.lock:
+            self.restantes = na_fila
+        self._atualizar_eta()
+
+    def linha_concluida(self, sucesso, duracao):
+        """Conta a linha, registra sua duração e recalcula o tempo restante."""
+        self.incrementar('ipasgo_linhas_total', resultado='processada' if sucesso else 'erro')
+        self.observar('ipasgo_linha_duracao_segundos', duracao)
+        with self.lock:
+            self.restantes = max(0, self.restantes - 1)
+            self.conclusoes.append(time.monotonic())
+        self._atualizar_eta()
+
+    def linhas_resolvidas_na_listagem(self, quantidade):
+        """Linhas da fila resolvidas pela listagem em lote, sem passar pelo fluxo por guia."""
+        self.incrementar('ipasgo_linhas_total', quantidade, resultado='listagem')
+        with self.lock:
+            self.restantes = max(0, self.restantes - quantidade)
+        self._atualizar_eta()
+
+    def linha_reagendada(self):
+        """A linha voltou para a fila de retentativas e conta de novo como restante."""
+        self.incrementar('ipasgo_linhas_reagendadas_total')
+        with self.lock:
+            self.restantes += 1
+        self._atualizar_eta()
+
+    def _atualizar_eta(self):
+        with self.lock:
+            restantes = self.restantes
+            conclusoes = list(self.conclusoes)
+        self.definir('ipasgo_linhas_restantes', restantes)
+        if len(conclusoes) >= 2 and conclusoes[-1] > conclusoes[0]:
+            ritmo = (len(conclusoes) - 1) / (conclusoes[-1] - conclusoes[0])  # Linhas por segundo
+            self.definir('ipasgo_tempo_restante_estimado_segundos', round(restantes / ritmo, 1))
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus."""
+        with self.lock:
+            series = defaultdict(list)
+            for (nome, rotulos), valor in self.contadores.items():
+                series[nome].append(f"{nome}{_rotulos(rotulos)} {valor:g}")
+            for (nome, rotulos), valor in self.gauges.items():
+                series[nome].append(f"{nome}{_rotulos(rotulos)} {valor:g}")
+            for (nome, rotulos), histograma in self.histogramas.items():
+                for limite, quantidade in zip(BUCKETS_PADRAO, histograma['buckets']):
+                    series[nome].append(f"{nome}_bucket{_rotulos(rotulos + (('le', f'{limite:g}'),))} {quantidade}")
+                series[nome].append(f"{nome}_bucket{_rotulos(rotulos + (('le', '+Inf'),))} {histograma['quantidade']}")
+                series[nome].append(f"{nome}_sum{_rotulos(rotulos)} {histograma['soma']:.3f}")
+                series[nome].append(f"{nome}_count{_rotulos(rotulos)} {histograma['quantidade']}")
+
+        linhas = []
+        for nome in sorted(series):
+            tipo, descricao = DESCRICOES.get(nome, ('untyped', ''))
+            linhas.append(f"# HELP {nome} {descricao}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            linhas.extend(series[nome])
+        return '\n'.join(linhas) + '\n'
+
+    def servir(self, porta, endereco='127.0.0.1'):
+        """Inicia o endpoint HTTP /metrics numa thread em segundo plano."""
+        metricas = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                corpo = metricas.exportar().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, format, *args):
+                pass  # Não polui o log da automação a cada coleta
+
+        servidor = ThreadingHTTPServer((endereco, porta), Handler)
+        threading.Thread(target=servidor.serve_forever, name='metricas', daemon=True).start()
+        logging.info(f"Métricas disponíveis em http://{endereco}:{porta}/metrics")
+        return servidor
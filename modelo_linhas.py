@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from diferencial import normalizar_coluna
+
+# Coluna da planilha -> atributo da linha, já convertidos para texto
+COLUNAS_TEXTO = {
+    'GUIA_COD': 'guia_cod',
+    'CARTEIRINHA': 'carteirinha',
+    'PACIENTE': 'paciente',
+    'CONFIRMACOES': 'confirmacoes',
+    'ERRO': 'erro',
+}
+# Coluna da planilha -> atributo da linha, já convertidos para inteiro (None quando vazio)
+COLUNAS_INTEIRO = {
+    'QTDE_AUT': 'qtde_aut',
+    'SOLICITADO': 'solicitado',
+    'REALIZADO': 'realizado',
+    'SALDOGUIA': 'saldo_guia',
+    'QT_CONFIRMADA': 'qt_confirmada',
+}
+# Únicas colunas alteradas pela automação; as demais são somente leitura no modelo
+COLUNAS_ALTERADAS = ('CONFIRMACOES', 'ERRO', 'QT_CONFIRMADA')
+
+
+class LinhaGuia:
+    """Uma linha da planilha com os campos usados pela automação já normalizados."""
+
+    __slots__ = ('indice',) + tuple(COLUNAS_TEXTO.values()) + tuple(COLUNAS_INTEIRO.values())
+
+    def __init__(self, indice, *valores):
+        self.indice = indice
+        for atributo, valor in zip(self.__slots__[1:], valores):
+            setattr(self, atributo, valor)
+
+    def __repr__(self):
+        return f"LinhaGuia(linha={self.indice + 2}, guia={self.guia_cod}, carteirinha={self.carteirinha})"
+
+
+def _coluna_inteiros(df, coluna):
+    """Converte uma coluna para uma lista de inteiros, com None nas células vazias ou inválidas."""
+    if coluna not in df.columns:
+        return [None] * len(df)
+    numeros = pd.to_numeric(df[coluna], errors='coerce')
+    vazios = numeros.isna().tolist()
+    inteiros = np.trunc(numeros.fillna(0).to_numpy(dtype=float)).astype('int64').tolist()
+    return [None if vazio else inteiro for vazio, inteiro in zip(vazios, inteiros)]
+
+
+class TabelaLinhas:
+    """
+    Conjunto de trabalho em memória sobre o DataFrame da planilha. Cada coluna é normalizada só no
+    primeiro acesso e cada LinhaGuia só é montada quando a linha é usada, para que carregar a planilha
+    não custe a criação de um objeto por linha quando apenas parte dela entra na fila.
+    """
+
+    def __init__(self, df):
+        self.df = df  # Deve ter o índice padrão 0..n-1
+        self._colunas = {}  # Coluna -> valores normalizados
+        self._linhas = {}  # Índice -> LinhaGuia já montada
+        self._ordem = None  # Colunas na ordem dos atributos de LinhaGuia, depois do primeiro acesso a uma linha
+        self._alteradas = set()  # Índices com resultados ainda não exportados para o DataFrame
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Cria a tabela sobre o DataFrame, que deve ter o índice padrão 0..n-1."""
+        return cls(df)
+
+    def _coluna(self, coluna):
+        """Valores normalizados da coluna, calculados uma vez no primeiro acesso."""
+        valores = self._colunas.get(coluna)
+        if valores is None:
+            if coluna in COLUNAS_INTEIRO:
+                valores = _coluna_inteiros(self.df, coluna)
+            elif coluna in self.df.columns:
+                valores = normalizar_coluna(self.df[coluna]).tolist()
+            else:
+                valores = [''] * len(self.df)
+            # setdefault mantém uma única lista se duas sessões calcularem a coluna ao mesmo tempo
+            valores = self._colunas.setdefault(coluna, valores)
+        return valores
+
+    def preparar_colunas(self):
+        """Normaliza de uma vez todas as colunas do modelo (por exemplo antes de dividir a fila entre sessões)."""
+        for coluna in (*COLUNAS_TEXTO, *COLUNAS_INTEIRO):
+            self._coluna(coluna)
+
+    def __getitem__(self, indice):
+        linha = self._linhas.get(indice)
+        if linha is None:
+            if not 0 <= indice < len(self):
+                raise IndexError(indice)
+            if self._ordem is None:
+                # Mesma ordem de LinhaGuia.__slots__: primeiro as colunas de texto, depois as de inteiro
+                self._ordem = [self._coluna(coluna) for coluna in (*COLUNAS_TEXTO, *COLUNAS_INTEIRO)]
+            linha = self._linhas.setdefault(indice, LinhaGuia(indice, *[valores[indice] for valores in self._ordem]))
+        return linha
+
+    def __len__(self):
+        return len(self.df)
+
+    def indice_guias(self):
+        """Dicionário GUIA_COD -> índices das linhas da guia, para casar resultados do portal em memória."""
+        indice = {}
+        for posicao, guia in enumerate(self._coluna('GUIA_COD')):
+            indice.setdefault(guia, []).append(posicao)
+        return indice
+
+    def contem(self, coluna):
+        """Indica se a coluna é representada no modelo."""
+        return coluna in COLUNAS_TEXTO or coluna in COLUNAS_INTEIRO
+
+    def valor(self, indice, coluna):
+        """Retorna o valor da coluna como texto, no mesmo formato de DataHandler.get_value."""
+        atributo = COLUNAS_TEXTO.get(coluna) or COLUNAS_INTEIRO[coluna]
+        linha = self._linhas.get(indice)
+        # Linhas ainda não montadas não foram alteradas: o valor vem direto da coluna normalizada
+        valor = getattr(linha, atributo) if linha is not None else self._coluna(coluna)[indice]
+        if valor is None:
+            return ""
+        return valor if isinstance(valor, str) else str(valor)
+
+    def atualizar(self, indice, coluna, valor):
+        """Atualiza uma coluna de resultado da linha e a marca para exportação."""
+        linha = self[indice]
+        if coluna in COLUNAS_INTEIRO:
+            valor = None if valor is None or valor == '' else int(valor)
+        else:
+            valor = '' if valor is None else str(valor)
+        setattr(linha, COLUNAS_TEXTO.get(coluna) or COLUNAS_INTEIRO[coluna], valor)
+        self._alteradas.add(indice)
+
+    def exportar(self, df):
+        """Copia para o DataFrame as colunas de resultado das linhas alteradas desde a última exportação."""
+        if not self._alteradas:
+            return 0
+        indices = sorted(self._alteradas)
+        alteradas = [self._linhas[indice] for indice in indices]
+        for coluna in COLUNAS_ALTERADAS:
+            atributo = COLUNAS_TEXTO.get(coluna) or COLUNAS_INTEIRO[coluna]
+            valores = [getattr(linha, atributo) for linha in alteradas]
+            df.loc[indices, coluna] = pd.Series(valores, index=indices, dtype=object)
+        self._alteradas.clear()
+        return len(alteradas)
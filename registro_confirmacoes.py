@@ -0,0 +1,144 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Caminho padrão do registro, pode ser trocado pela variável de ambiente IPASGO_REGISTRO_PATH
+REGISTRO_PATH_PADRAO = os.environ.get('IPASGO_REGISTRO_PATH', 'registro_confirmacoes.jsonl')
+
+
+class RegistroConfirmacoes:
+    """Registro append-only das confirmações capturadas, uma linha JSON por guia processada."""
+
+    def __init__(self, path=REGISTRO_PATH_PADRAO, run_id=None):
+        self.path = Path(path)
+        self.run_id = run_id or time.strftime('%Y%m%d-%H%M%S')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Um único arquivo aberto e bufferizado durante toda a execução
+        self._arquivo = open(self.path, 'a', encoding='utf-8', buffering=64 * 1024)
+        # O mesmo registro pode ser compartilhado por várias sessões do navegador
+        self._lock = threading.Lock()
+        # Enquanto a execução grava no registro, a compactação (que troca o arquivo) é recusada
+        self.arquivo_trava = self.path.with_name(f"{self.path.name}.{os.getpid()}.{id(self):x}.lock")
+        self.arquivo_trava.write_text(f"{os.getpid()} {self.run_id}\n", encoding='utf-8')
+
+    def registrar(self, guia, linha, confirmacoes, qt_confirmada):
+        """Acrescenta o status de uma guia ao registro."""
+        registro = {
+            'guia': str(guia),
+            'run': self.run_id,
+            'linha': linha,
+            'data_hora': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'confirmacoes': confirmacoes,
+            'qt_confirmada': qt_confirmada,
+        }
+        with self._lock:
+            self._arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    def fechar(self):
+        """Descarrega o buffer e fecha o arquivo."""
+        with self._lock:
+            if self._arquivo.closed:
+                return
+            self._arquivo.close()
+            self.arquivo_trava.unlink(missing_ok=True)
+            logging.info(f"Registro de confirmações salvo em '{self.path}'.")
+
+
+def ler_registros(path):
+    """Lê todos os registros do arquivo, ignorando linhas corrompidas."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for numero, linha in enumerate(f, start=1):
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                yield json.loads(linha)
+            except json.JSONDecodeError:
+                logging.warning(f"Linha {numero} do registro está corrompida e foi ignorada.")
+
+
+def indexar(path):
+    """Retorna um dicionário guia -> registro mais recente."""
+    indice = {}
+    for registro in ler_registros(path):
+        indice[registro['guia']] = registro
+    return indice
+
+
+def travas_ativas(path):
+    """Arquivos de trava das execuções que estão gravando no registro."""
+    path = Path(path)
+    return sorted(path.parent.glob(f"{path.name}.*.lock"))
+
+
+def compactar(path, forcar=False):
+    """
+    Reescreve o registro mantendo apenas o status mais recente de cada guia.
+    Recusa se alguma execução ainda estiver gravando nele: os registros acrescentados por ela seriam perdidos
+    na troca do arquivo (e no Windows a troca falha com o arquivo aberto).
+    """
+    path = Path(path)
+    travas = travas_ativas(path)
+    if travas and not forcar:
+        raise Exception(
+            f"O registro '{path}' está em uso por uma execução ({', '.join(trava.name for trava in travas)}). "
+            f"Compacte depois que ela terminar, ou apague a trava se a execução não estiver mais rodando."
+        )
+    indice = indexar(path)
+    temporario = path.with_name(path.name + '.tmp')
+    with open(temporario, 'w', encoding='utf-8') as f:
+        for registro in indice.values():
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    os.replace(temporario, path)
+    logging.info(f"Registro compactado: {len(indice)} guias mantidas em '{path}'.")
+    return len(indice)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta e compactação do registro de confirmações.")
+    parser.add_argument('--arquivo', default=REGISTRO_PATH_PADRAO, help="Caminho do registro (.jsonl).")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    consultar = sub.add_parser('consultar', help="Mostra o status mais recente das guias informadas.")
+    consultar.add_argument('guias', nargs='+')
+
+    listar = sub.add_parser('listar', help="Lista os registros, opcionalmente de uma única execução.")
+    listar.add_argument('--run', help="Identificador da execução.")
+
+    compactar_parser = sub.add_parser('compactar', help="Mantém apenas o status mais recente de cada guia.")
+    compactar_parser.add_argument('--forcar', action='store_true', help="Compacta mesmo com trava de execução ativa.")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'consultar':
+        indice = indexar(args.arquivo)
+        for guia in args.guias:
+            registro = indice.get(guia)
+            if registro is None:
+                print(f"{guia}: não encontrada")
+            else:
+                print(f"{guia}: {registro['confirmacoes']} (run {registro['run']}, {registro['data_hora']})")
+    elif args.comando == 'listar':
+        for registro in ler_registros(args.arquivo):
+            if args.run is None or registro['run'] == args.run:
+                print(json.dumps(registro, ensure_ascii=False))
+    elif args.comando == 'compactar':
+        try:
+            compactar(args.arquivo, args.forcar)
+        except Exception as e:
+            logging.error(str(e))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
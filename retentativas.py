@@ -0,0 +1,113 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+
+# Classes de erro (pela mensagem gravada na coluna ERRO) e trechos que as identificam, na ordem de verificação
+CLASSES_ERRO = [
+    # Vem antes de 'timeout': a espera pelo status depois do clique é a falha mais comum aqui
+    ('pos_confirmacao', ('após confirmar',)),
+    ('dados', ('não encontrado no excel', 'não encontrada no excel')),
+    ('beneficiario', ('beneficiário divergente',)),
+    ('navegador', ('invalid session', 'no such window', 'chrome not reachable', 'disconnected')),
+    ('elemento_obsoleto', ('stale element',)),
+    ('clique_interceptado', ('click intercepted', 'not clickable', 'não foi possível clicar')),
+    ('timeout', ('timeout', 'timed out', 'após', 'tentativas')),
+]
+# Erros que não se resolvem tentando de novo na mesma execução; depois do clique em Confirmar,
+# repetir a linha pode confirmar o procedimento uma segunda vez
+CLASSES_PERMANENTES = {'dados', 'beneficiario', 'pos_confirmacao'}
+
+
+def mensagem_erro(e):
+    """
+    Texto do erro para a coluna ERRO e para a classificação.
+    Os timeouts do WebDriverWait chegam com msg vazia; nesse caso o nome da exceção identifica o erro.
+    """
+    if hasattr(e, 'msg'):
+        return e.msg or f"{type(e).__name__}: {e}".strip()
+    return str(e) or type(e).__name__
+
+
+def classificar_erro(mensagem):
+    """Classe do erro a partir da mensagem, usada para decidir se a linha volta para a fila."""
+    texto = (mensagem or '').lower()
+    for classe, trechos in CLASSES_ERRO:
+        if any(trecho in texto for trecho in trechos):
+            return classe
+    return 'desconhecido'
+
+
+class FilaRetentativas:
+    """
+    Fila de linhas que falharam, reprocessadas depois da passada principal (ou por sessões ociosas)
+    com espera exponencial entre as tentativas e um limite de tentativas por linha.
+    """
+
+    def __init__(self, max_tentativas=3, espera_base=30, espera_max=600):
+        self.max_tentativas = max_tentativas  # Inclui a tentativa da passada principal
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.tentativas = Counter()  # Linha -> tentativas já feitas
+        self.motivos = {}  # Linha -> classe do último erro
+        self.agendadas = []  # Heap de (pronta_em, linha)
+        self.em_andamento = 0
+        self.recuperadas = 0
+        self.esgotadas = 0
+        self.lock = threading.Lock()
+
+    def iniciar(self, idx):
+        """Marca o início de uma tentativa da linha (da passada principal ou da fila)."""
+        with self.lock:
+            self.tentativas[idx] += 1
+            self.em_andamento += 1
+            return self.tentativas[idx]
+
+    def registrar_resultado(self, idx, sucesso, mensagem=''):
+        """Encerra a tentativa; em caso de falha, agenda a linha de novo se ainda for possível. Retorna se agendou."""
+        with self.lock:
+            self.em_andamento -= 1
+            tentativa = self.tentativas[idx]
+            if sucesso:
+                if tentativa > 1:
+                    self.recuperadas += 1
+                    logging.info(f"Linha {idx + 2} recuperada na tentativa {tentativa} (erro anterior: {self.motivos.pop(idx, '')}).")
+                return False
+
+            classe = classificar_erro(mensagem)
+            self.motivos[idx] = classe
+            if classe in CLASSES_PERMANENTES or tentativa >= self.max_tentativas:
+                self.esgotadas += 1
+                logging.warning(f"Linha {idx + 2} não será tentada de novo ({classe}, {tentativa} tentativas).")
+                return False
+
+            espera = min(self.espera_max, self.espera_base * 2 ** (tentativa - 1))
+            heapq.heappush(self.agendadas, (time.monotonic() + espera, idx))
+            logging.info(f"Linha {idx + 2} agendada para nova tentativa em {espera:.0f}s ({classe}, tentativa {tentativa} de {self.max_tentativas}).")
+            return True
+
+    def proxima_pronta(self):
+        """Retira a próxima linha cuja espera já terminou, ou None."""
+        with self.lock:
+            if self.agendadas and self.agendadas[0][0] <= time.monotonic():
+                return heapq.heappop(self.agendadas)[1]
+            return None
+
+    def tempo_ate_proxima(self):
+        """Segundos até a próxima linha agendada ficar pronta (None se não houver)."""
+        with self.lock:
+            if not self.agendadas:
+                return None
+            return max(0.0, self.agendadas[0][0] - time.monotonic())
+
+    def esgotada(self):
+        """True quando não há linhas agendadas nem tentativas em andamento que possam gerar novas."""
+        with self.lock:
+            return not self.agendadas and self.em_andamento == 0
+
+    def resumo(self):
+        logging.info(
+            f"Retentativas: {self.recuperadas} linhas recuperadas, {self.esgotadas} sem sucesso "
+            f"(motivos: {dict(Counter(self.motivos.values()))})."
+        )
@@ -0,0 +1,78 @@
+import argparse
+import logging
+import zlib
+
+import pandas as pd
+
+from cache_planilha import tipar_colunas_resultado
+from diferencial import normalizar_coluna
+from modelo_linhas import COLUNAS_ALTERADAS
+
+
+def parse_shard(texto):
+    """Converte 'i/n' (i de 1 a n) em uma tupla (i, n). Usado como type= do argumento --shard."""
+    try:
+        indice, total = (int(parte) for parte in texto.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard inválido '{texto}', use o formato i/n (ex.: 1/2).")
+    if total < 1 or not 1 <= indice <= total:
+        raise argparse.ArgumentTypeError(f"shard inválido '{texto}', o índice deve estar entre 1 e {max(total, 1)}.")
+    return indice, total
+
+
+def shard_da_guia(numero_guia, total):
+    """Shard (1 a total) da guia; determinístico entre máquinas e execuções, ao contrário de hash()."""
+    return zlib.crc32(str(numero_guia).encode('utf-8')) % total + 1
+
+
+def linhas_do_shard(df, indice, total):
+    """Índices das linhas cujo GUIA_COD pertence ao shard. Todas as linhas de uma guia ficam no mesmo shard."""
+    if total == 1:
+        return set(df.index)
+    guias = normalizar_coluna(df['GUIA_COD'])
+    shards = {guia: shard_da_guia(guia, total) for guia in guias.unique()}
+    return set(df.index[guias.map(shards) == indice])
+
+
+def mesclar_resultados(planilha_mestre, saidas, sheet_name):
+    """
+    Copia para a planilha mestre, numa única passada, os resultados gravados nas planilhas de cada shard.
+    As saídas dos shards são cópias da mestre, então as linhas são casadas pela posição e conferidas pelo GUIA_COD.
+    """
+    mestre = pd.read_excel(planilha_mestre, sheet_name=sheet_name)
+    mestre.columns = [col.upper().strip() for col in mestre.columns]
+    for col in COLUNAS_ALTERADAS:
+        mestre[col] = mestre[col].astype(object) if col in mestre.columns else ''
+    guias_mestre = normalizar_coluna(mestre['GUIA_COD'])
+    # Cada shard é comparado com a mestre original, não com a já mesclada
+    originais = {col: normalizar_coluna(mestre[col]) for col in COLUNAS_ALTERADAS}
+    ja_mescladas = pd.Series(False, index=mestre.index)
+
+    total_copiadas = 0
+    for saida in saidas:
+        shard = pd.read_excel(saida, sheet_name=sheet_name)
+        shard.columns = [col.upper().strip() for col in shard.columns]
+        if len(shard) != len(mestre):
+            raise Exception(f"A planilha '{saida}' tem {len(shard)} linhas, a mestre tem {len(mestre)}.")
+        if not normalizar_coluna(shard['GUIA_COD']).equals(guias_mestre):
+            raise Exception(f"As guias de '{saida}' não correspondem às da planilha mestre.")
+
+        # Só as linhas processadas pelo shard diferem da mestre
+        alteradas = pd.Series(False, index=mestre.index)
+        for col in COLUNAS_ALTERADAS:
+            if col in shard.columns:
+                alteradas |= normalizar_coluna(shard[col]) != originais[col]
+        conflitos = int((alteradas & ja_mescladas).sum())
+        if conflitos:
+            logging.warning(f"{conflitos} linhas de '{saida}' também foram alteradas por outro shard; prevalece '{saida}'.")
+        ja_mescladas |= alteradas
+        for col in COLUNAS_ALTERADAS:
+            if col in shard.columns:
+                mestre.loc[alteradas, col] = shard.loc[alteradas, col].astype(object)
+        logging.info(f"{int(alteradas.sum())} linhas copiadas de '{saida}'.")
+        total_copiadas += int(alteradas.sum())
+
+    tipar_colunas_resultado(mestre)
+    mestre.to_excel(planilha_mestre, sheet_name=sheet_name, index=False)
+    logging.info(f"Planilha mestre atualizada com {total_copiadas} linhas: {planilha_mestre}")
+    return total_copiadas
@@ -0,0 +1,86 @@
+import json
+import logging
+import re
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+
+# Retorna o HTML do modal visível (mais útil e menor que a página inteira) ou do documento todo
+SCRIPT_HTML = """
+var modais = document.querySelectorAll('.modal');
+for (var i = 0; i < modais.length; i++) {
+    if (modais[i].offsetParent !== null) { return modais[i].outerHTML; }
+}
+return document.documentElement.outerHTML;
+"""
+
+
+class BufferSnapshots:
+    """
+    Buffer circular em memória com os últimos snapshots do DOM, comprimidos.
+    Nada é gravado em disco no caminho feliz: os snapshots só são despejados quando uma etapa falha.
+    """
+
+    def __init__(self, pasta, max_snapshots=8, max_bytes=16 * 1024 * 1024):
+        self.pasta = Path(pasta)
+        self.max_snapshots = max_snapshots
+        self.max_bytes = max_bytes
+        self.snapshots = deque()
+        self.bytes_em_uso = 0
+
+    def capturar(self, driver, etapa, linha):
+        """Guarda o HTML atual comprimido; descarta os mais antigos ao passar dos limites."""
+        try:
+            html = driver.execute_script(SCRIPT_HTML) or ''
+            url = driver.current_url
+        except Exception as e:
+            logging.warning(f"Não foi possível capturar o snapshot do DOM: {e}")
+            return
+        # Nível 1: compressão rápida, o objetivo é só caber na memória
+        comprimido = zlib.compress(html.encode('utf-8'), 1)
+        self.snapshots.append({
+            'data_hora': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'etapa': etapa,
+            'linha': linha,
+            'url': url,
+            'html': comprimido,
+        })
+        self.bytes_em_uso += len(comprimido)
+        while self.snapshots and (len(self.snapshots) > self.max_snapshots or self.bytes_em_uso > self.max_bytes):
+            self.bytes_em_uso -= len(self.snapshots.popleft()['html'])
+
+    def despejar(self, motivo, linha, guia):
+        """Grava os snapshots do buffer numa pasta com o contexto do erro e esvazia o buffer."""
+        if not self.snapshots:
+            return None
+        nome_guia = re.sub(r'[^\w-]', '_', str(guia or 'sem_guia'))
+        agora = time.time()
+        base = f"linha_{linha}_guia_{nome_guia}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(agora))}-{int(agora % 1 * 1000):03d}"
+        try:
+            self.pasta.mkdir(parents=True, exist_ok=True)
+            # Dois despejos no mesmo milissegundo (por exemplo de sessões diferentes) não sobrescrevem um ao outro
+            destino = self.pasta / base
+            sequencia = 1
+            while True:
+                try:
+                    destino.mkdir()
+                    break
+                except FileExistsError:
+                    sequencia += 1
+                    destino = self.pasta / f"{base}_{sequencia}"
+            indice = []
+            for posicao, snapshot in enumerate(self.snapshots, start=1):
+                arquivo = f"{posicao:02d}_{snapshot['etapa'] or 'inicio'}.html"
+                (destino / arquivo).write_bytes(zlib.decompress(snapshot['html']))
+                indice.append({**{k: v for k, v in snapshot.items() if k != 'html'}, 'arquivo': arquivo})
+            contexto = {'motivo': motivo, 'linha': linha, 'guia': guia, 'snapshots': indice}
+            (destino / 'contexto.json').write_text(json.dumps(contexto, ensure_ascii=False, indent=2), encoding='utf-8')
+            logging.info(f"{len(indice)} snapshots do DOM gravados em '{destino}'.")
+        except Exception as e:
+            logging.error(f"Erro ao gravar os snapshots do DOM: {e}")
+            return None
+        finally:
+            self.snapshots.clear()
+            self.bytes_em_uso = 0
+        return destino
@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+from cache_planilha import caminho_cache, carregar_cache, salvar_cache, tipar_colunas_resultado
+
+pytest.importorskip('pyarrow')
+openpyxl = pytest.importorskip('openpyxl')
+
+from version_tree import DataHandler  # noqa: E402
+
+ABA = 'Planilha1'
+
+
+@pytest.fixture
+def planilha(tmp_path):
+    caminho = tmp_path / 'guias.xlsx'
+    pd.DataFrame({
+        'GUIA_COD': [100, 200, 300],
+        'CARTEIRINHA': ['0667000001', '0667000002', '0667000003'],
+        'PACIENTE': ['ANA', 'BRUNO', 'CARLA'],
+    }).to_excel(caminho, sheet_name=ABA, index=False)
+    return caminho
+
+
+def recarregar(caminho, frio):
+    if frio:
+        caminho_cache(caminho, ABA).unlink(missing_ok=True)
+    return DataHandler(str(caminho), ABA).df
+
+
+def test_carga_quente_igual_a_fria_depois_de_salvar(planilha):
+    dados = DataHandler(str(planilha), ABA)
+    dados.update_value(0, 'QT_CONFIRMADA', 2)
+    dados.update_value(0, 'CONFIRMACOES', 'Confirmado 01/02/2024; Não confirmado')
+    dados.update_value(1, 'ERRO', '')
+    dados.update_value(2, 'ERRO', 'Timeout')
+    dados.save()
+
+    quente = recarregar(planilha, frio=False)
+    fria = recarregar(planilha, frio=True)
+    pd.testing.assert_frame_equal(quente, fria)
+    assert quente['QT_CONFIRMADA'].dtype == 'Int64'
+    assert quente.loc[0, 'QT_CONFIRMADA'] == 2
+    assert pd.isna(quente.loc[1, 'ERRO'])
+
+
+def test_quantidade_salva_como_numero_no_xlsx(planilha):
+    dados = DataHandler(str(planilha), ABA)
+    dados.update_value(0, 'QT_CONFIRMADA', 2)
+    dados.save()
+    # Um segundo save, partindo do cache, não pode transformar a coluna em texto
+    DataHandler(str(planilha), ABA).save()
+
+    planilha_xlsx = openpyxl.load_workbook(planilha)[ABA]
+    cabecalho = [celula.value for celula in planilha_xlsx[1]]
+    celula = planilha_xlsx.cell(row=2, column=cabecalho.index('QT_CONFIRMADA') + 1)
+    assert celula.value == 2
+    assert celula.data_type == 'n'
+
+
+def test_tipar_colunas_resultado():
+    df = pd.DataFrame({
+        'CONFIRMACOES': ['Confirmado', '', None],
+        'ERRO': [float('nan'), ' ', 'Timeout'],
+        'QT_CONFIRMADA': pd.Series([2, '', '3'], dtype=object),
+    })
+    tipar_colunas_resultado(df)
+    assert df['CONFIRMACOES'].tolist() == ['Confirmado', None, None]
+    assert df['ERRO'].tolist() == [None, None, 'Timeout']
+    assert df['QT_CONFIRMADA'].dtype == 'Int64'
+    assert df['QT_CONFIRMADA'].tolist() == [2, pd.NA, 3]
+
+
+def test_cache_desatualizado_nao_e_usado(planilha):
+    DataHandler(str(planilha), ABA)
+    assert carregar_cache(planilha, ABA) is not None
+    pd.DataFrame({'GUIA_COD': [1]}).to_excel(planilha, sheet_name=ABA, index=False)
+    assert carregar_cache(planilha, ABA) is None
+
+
+def test_salvar_cache_nao_altera_o_dataframe(planilha):
+    df = pd.DataFrame({'QT_CONFIRMADA': pd.Series(['', 1], dtype=object)})
+    salvar_cache(df, planilha, ABA)
+    assert df['QT_CONFIRMADA'].tolist() == ['', 1]
+
+
+def test_checkpoint_salva_a_cada_tantas_linhas(planilha):
+    dados = DataHandler(str(planilha), ABA, checkpoint_linhas=2, checkpoint_segundos=3600)
+    dados.update_value(0, 'ERRO', 'Timeout')
+    assert not dados.checkpoint()
+    assert pd.isna(recarregar(planilha, frio=True).loc[0, 'ERRO'])
+
+    dados.update_value(1, 'ERRO', 'Timeout')
+    assert dados.checkpoint()
+    fria = recarregar(planilha, frio=True)
+    assert list(fria.loc[:1, 'ERRO']) == ['Timeout', 'Timeout']
+    # O contador recomeça depois do save
+    assert not dados.checkpoint()
+
+
+def test_checkpoint_salva_quando_o_tempo_passou(planilha):
+    dados = DataHandler(str(planilha), ABA, checkpoint_linhas=100, checkpoint_segundos=0)
+    dados.update_value(2, 'QT_CONFIRMADA', 1)
+    assert dados.checkpoint()
+    assert recarregar(planilha, frio=True).loc[2, 'QT_CONFIRMADA'] == 1
+
+
+def test_checkpoint_nao_espera_outra_gravacao(planilha):
+    dados = DataHandler(str(planilha), ABA, checkpoint_linhas=1)
+    dados.update_value(0, 'ERRO', 'Timeout')
+    with dados.trava_escrita:
+        # Outra sessão está gravando: esta segue sem salvar e a linha entra no próximo save
+        assert not dados.checkpoint()
+    dados.save()
+    assert recarregar(planilha, frio=True).loc[0, 'ERRO'] == 'Timeout'
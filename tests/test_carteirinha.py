@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import pytest
+
+from selenium.webdriver.common.keys import Keys
+
+from carteirinha import ESPERA_FIXA_ANTERIOR, BeneficiarioDivergente, ResolvedorCarteirinha, _numeros
+
+
+class Opcao:
+    """Sugestão do autocomplete: só o texto e o clique."""
+
+    def __init__(self, text):
+        self.text = text
+        self.clicada = False
+
+    def click(self):
+        self.clicada = True
+
+
+class Campo:
+    """Campo da carteira; o valor muda para `valor_apos_escolha` quando uma sugestão é clicada ou escolhida pelo teclado."""
+
+    def __init__(self, valor='', valor_apos_escolha='0667000001'):
+        self.valor = valor
+        self.valor_apos_escolha = valor_apos_escolha
+        self.teclas = []
+
+    def get_attribute(self, nome):
+        return self.valor
+
+    def clear(self):
+        self.valor = ''
+
+    def send_keys(self, tecla):
+        self.teclas.append(tecla)
+        if tecla == Keys.ENTER:
+            self.valor = self.valor_apos_escolha
+        elif tecla != Keys.ARROW_DOWN:
+            self.valor += tecla
+
+
+@pytest.fixture
+def resolvedor():
+    return ResolvedorCarteirinha(SimpleNamespace(driver=None, metricas=None))
+
+
+def escolher(resolvedor, textos, carteira='0667000001', paciente=''):
+    opcoes = [Opcao(texto) for texto in textos]
+    opcao, _ = resolvedor._escolher(opcoes, carteira, paciente)
+    return None if opcao is None else opcao.text
+
+
+@pytest.mark.parametrize('texto', [
+    "0667000001 - 12/05/1980 - JOAO DA SILVA",
+    "0667000001 - 123.456.789-00 - JOAO DA SILVA",
+    "0667000001 123.456.789-00 JOAO DA SILVA",
+    "JOAO DA SILVA - 0667000001",
+    "0667.0000.01 - JOAO DA SILVA",
+    "667000001 - JOAO DA SILVA",
+])
+def test_escolher_pela_carteira_em_varios_formatos(resolvedor, texto):
+    outra = "0123456789 - 01/01/1970 - MARIA SOUZA"
+    assert escolher(resolvedor, [outra, texto]) == texto
+
+
+def test_numeros_nao_junta_carteira_com_data_ou_cpf():
+    assert _numeros("0667000001 - 12/05/1980 - JOAO") == {'667000001', '12051980'}
+    assert _numeros("0667000001 - 123.456.789-00") == {'667000001', '12345678900'}
+
+
+def test_escolher_nao_aceita_carteira_contida_em_outro_numero(resolvedor):
+    assert escolher(resolvedor, ["10667000001 - 12/05/1980 - MARIA SOUZA"]) is None
+
+
+def test_escolher_pelo_nome_quando_a_carteira_nao_aparece(resolvedor):
+    textos = ["MARIA SOUZA - 01/01/1970", "João da Silva - 12/05/1980"]
+    assert escolher(resolvedor, textos, carteira='999', paciente='JOAO DA SILVA') == textos[1]
+
+
+def test_escolher_sem_correspondencia_devolve_os_textos(resolvedor):
+    opcoes = [Opcao("0123456789 - MARIA SOUZA")]
+    opcao, textos = resolvedor._escolher(opcoes, '0667000001', 'JOAO DA SILVA')
+    assert opcao is None
+    assert textos == ["0123456789 - MARIA SOUZA"]
+
+
+def test_escolher_prefere_a_sugestao_em_cache(resolvedor):
+    textos = ["0667000001 - JOAO DA SILVA", "0667000001 - JOAO DA SILVA (DEPENDENTE)"]
+    resolvedor.cache['0667000001'] = textos[1]
+    assert escolher(resolvedor, textos) == textos[1]
+
+
+def test_resolver_reaproveita_o_valor_deixado_no_campo(resolvedor, monkeypatch):
+    opcao = Opcao("0667000001 - 12/05/1980 - JOAO")
+    monkeypatch.setattr(resolvedor, '_aguardar_sugestoes', lambda: [opcao])
+    campo = Campo()
+    # O clique na sugestão deixa no campo um valor diferente do texto da sugestão
+    opcao.click = lambda: setattr(campo, 'valor', campo.valor_apos_escolha)
+
+    assert resolvedor.resolver(campo, '0667000001') == opcao.text
+    assert resolvedor.resolver(campo, '0667000001') == opcao.text
+    assert resolvedor.estatisticas['autocomplete'] == 1
+    assert resolvedor.estatisticas['cache'] == 1
+
+
+def test_resolver_pelo_teclado_conta_o_tempo_perdido(resolvedor, monkeypatch):
+    monkeypatch.setattr(resolvedor, '_aguardar_sugestoes', lambda: [])
+    # A lista não aparece e a espera por ela passa meio segundo da espera fixa anterior
+    instantes = iter([0.0, ESPERA_FIXA_ANTERIOR + 0.5])
+    monkeypatch.setattr('carteirinha.time.monotonic', lambda: next(instantes))
+
+    assert resolvedor.resolver(Campo(), '0667000001') is None
+    assert resolvedor.estatisticas['teclado'] == 1
+    assert resolvedor.tempo_economizado == pytest.approx(-0.5)
+
+
+def test_resolver_sem_correspondencia_lanca_divergencia(resolvedor, monkeypatch):
+    monkeypatch.setattr(resolvedor, '_aguardar_sugestoes', lambda: [Opcao("0123456789 - MARIA SOUZA")])
+    with pytest.raises(BeneficiarioDivergente, match="Beneficiário divergente"):
+        resolvedor.resolver(Campo(), '0667000001', 'JOAO DA SILVA')
+
+
+def test_resolver_pelo_teclado_confere_o_valor_escolhido(resolvedor, monkeypatch):
+    monkeypatch.setattr(resolvedor, '_aguardar_sugestoes', lambda: [])
+    campo = Campo(valor_apos_escolha="0123456789 - MARIA SOUZA")
+    with pytest.raises(BeneficiarioDivergente, match="escolhida pelo teclado"):
+        resolvedor.resolver(campo, '0667000001', 'JOAO DA SILVA')
+    assert resolvedor.estatisticas['divergencias'] == 1
+    assert resolvedor.estatisticas['teclado'] == 0
+
+    # O valor deixado pela opção pode trazer só o nome do paciente
+    assert resolvedor.resolver(Campo(valor_apos_escolha="João da Silva"), '0667000001', 'JOAO DA SILVA') is None
+    assert resolvedor.estatisticas['teclado'] == 1
@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from diferencial import DiferencialExecucao, calcular_hashes, linhas_concluidas
+
+
+class Planilha:
+    """O mínimo do DataHandler usado pelo modo diferencial."""
+
+    def __init__(self, df):
+        self.df = df
+        self.recarregada = False
+
+    def reload_rows(self):
+        self.recarregada = True
+
+    def flush_rows(self):
+        pass
+
+
+def planilha(linhas):
+    """DataFrame com as colunas de entrada e de resultado; cada linha é (guia, paciente, procedimento, saldo, confirmacoes, erro, qt)."""
+    df = pd.DataFrame(linhas, columns=['GUIA_COD', 'PACIENTE', 'PROCEDIMENTO', 'SALDOGUIA', 'CONFIRMACOES', 'ERRO', 'QT_CONFIRMADA'])
+    for col in ('CONFIRMACOES', 'ERRO', 'QT_CONFIRMADA'):
+        df[col] = df[col].astype(object)
+    return df
+
+
+@pytest.fixture
+def anterior():
+    """Resultado da execução anterior."""
+    return planilha([
+        (100, 'ANA', 1, 3, 'Confirmado 01/02/2024', '', 1),  # 0: concluída, não muda
+        (200, 'BRUNO', 1, 2, 'Não confirmado', '', 0),  # 1: pendente
+        (300, 'CARLA', 1, 1, '', 'Timeout', ''),  # 2: com erro
+        (400, 'DANI', 1, 5, 'Confirmado 02/02/2024', '', 1),  # 3: concluída, mas vai mudar
+        (500, 'EDU', 7, 2, 'Confirmado 03/02/2024', '', 1),  # 4: chave repetida, 1ª ocorrência concluída
+        (500, 'EDU', 7, 2, 'Não confirmado', '', 0),  # 5: chave repetida, 2ª ocorrência pendente
+    ])
+
+
+def nova_exportacao():
+    """A mesma planilha exportada de novo: resultados vazios, uma linha nova no topo e a guia 400 alterada."""
+    return planilha([
+        (900, 'NOVO', 1, 1, '', '', ''),  # nova
+        (100, 'ANA', 1, 3, '', '', ''),
+        (200, 'BRUNO', 1, 2, '', '', ''),
+        (300, 'CARLA', 1, 1, '', '', ''),
+        (400, 'DANI', 1, 4, '', '', ''),  # saldo mudou
+        (500, 'EDU', 7, 2, '', '', ''),
+        (500, 'EDU', 7, 2, '', '', ''),
+    ])
+
+
+def test_sem_estado_anterior_processa_todas(tmp_path):
+    dados = Planilha(nova_exportacao())
+    assert DiferencialExecucao(tmp_path / 'estado.pkl').planejar(dados) == list(range(7))
+
+
+def test_planejar_reaproveita_so_linhas_concluidas_e_inalteradas(tmp_path, anterior):
+    diferencial = DiferencialExecucao(tmp_path / 'estado.pkl')
+    diferencial.salvar_estado(Planilha(anterior))
+
+    dados = Planilha(nova_exportacao())
+    pendentes = diferencial.planejar(dados)
+
+    # Reaproveitadas: ANA (concluída e igual) e a 1ª ocorrência de EDU, casadas pela chave e não pela posição
+    assert pendentes == [0, 2, 3, 4, 6]
+    df = dados.df
+    assert df.loc[1, 'CONFIRMACOES'] == 'Confirmado 01/02/2024'
+    assert df.loc[5, 'CONFIRMACOES'] == 'Confirmado 03/02/2024'
+    assert df.loc[5, 'QT_CONFIRMADA'] == 1
+    # Linhas pendentes, com erro ou alteradas não recebem o resultado anterior
+    assert df.loc[[2, 3, 4, 6], 'CONFIRMACOES'].tolist() == ['', '', '', '']
+    assert dados.recarregada
+
+
+def test_ocorrencia_diferencia_chaves_repetidas(anterior):
+    hashes = calcular_hashes(anterior)
+    assert hashes.loc[4, 'CHAVE'] == hashes.loc[5, 'CHAVE']
+    assert hashes['OCORRENCIA'].tolist() == [0, 0, 0, 0, 0, 1]
+
+
+def test_hash_ignora_colunas_de_resultado(anterior):
+    limpa = anterior.copy()
+    limpa[['CONFIRMACOES', 'ERRO', 'QT_CONFIRMADA']] = ''
+    assert calcular_hashes(anterior)['HASH'].tolist() == calcular_hashes(limpa)['HASH'].tolist()
+
+
+def test_linhas_concluidas(anterior):
+    assert linhas_concluidas(anterior).tolist() == [True, False, False, True, True, False]
+
+
+def test_estado_corrompido_processa_todas(tmp_path):
+    estado = tmp_path / 'estado.pkl'
+    estado.write_bytes(b'nao e pickle')
+    dados = Planilha(nova_exportacao())
+    assert DiferencialExecucao(estado).planejar(dados) == list(range(7))
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.by import By
+
+from localizadores import RegistroLocalizadores
+
+PRINCIPAL = (By.ID, 'principal')
+ALTERNATIVO = (By.CSS_SELECTOR, '[id$="alternativo"]')
+
+
+class Elemento:
+    def __init__(self, nome):
+        self.nome = nome
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+
+class Driver:
+    """Driver mínimo: só os seletores em `elementos` estão na tela."""
+
+    current_window_handle = 'aba-1'
+
+    def __init__(self, elementos):
+        self.elementos = elementos
+
+    def find_element(self, by, valor):
+        if (by, valor) not in self.elementos:
+            raise NoSuchElementException(valor)
+        return self.elementos[(by, valor)]
+
+    def find_elements(self, by, valor):
+        return [self.elementos[(by, valor)]] if (by, valor) in self.elementos else []
+
+
+def registro(elementos):
+    return RegistroLocalizadores(Driver(elementos), {'alvo': [PRINCIPAL, ALTERNATIVO]})
+
+
+def test_alternativo_nao_espera_o_tempo_do_principal():
+    localizadores = registro({ALTERNATIVO: Elemento('alternativo')})
+    inicio = time.monotonic()
+    assert localizadores.localizar('alvo', timeout=5).nome == 'alternativo'
+    assert time.monotonic() - inicio < 1
+    assert localizadores.estatisticas['alvo']['alternativo'] == 1
+
+
+def test_principal_vence_quando_os_dois_estao_na_tela():
+    localizadores = registro({PRINCIPAL: Elemento('principal'), ALTERNATIVO: Elemento('alternativo')})
+    assert localizadores.localizar('alvo').nome == 'principal'
+    assert localizadores.estatisticas['alvo']['alternativo'] == 0
+
+
+def test_nenhum_seletor_encontra():
+    localizadores = registro({})
+    with pytest.raises(TimeoutException, match="nenhum dos 2 seletores"):
+        localizadores.localizar('alvo', timeout=0.1)
+    assert localizadores.estatisticas['alvo']['falhas'] == 1
+
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from registro_confirmacoes import RegistroConfirmacoes, compactar, indexar, ler_registros, main, travas_ativas
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return tmp_path / 'registro.jsonl'
+
+
+def gravar(caminho, *registros):
+    """Grava os registros (guia, linha, confirmacoes, qt) numa execução já encerrada."""
+    registro = RegistroConfirmacoes(caminho, run_id='run')
+    for guia, linha, confirmacoes, qt in registros:
+        registro.registrar(guia, linha, confirmacoes, qt)
+    registro.fechar()
+
+
+def test_indexar_mantem_o_registro_mais_recente(caminho):
+    gravar(caminho, (100, 2, 'Não confirmado', 0), (200, 3, 'Confirmado 01/02/2024', 1), (100, 2, 'Confirmado 02/02/2024', 1))
+    indice = indexar(caminho)
+    assert set(indice) == {'100', '200'}
+    assert indice['100']['confirmacoes'] == 'Confirmado 02/02/2024'
+
+
+def test_indexar_ignora_linhas_corrompidas(caminho):
+    gravar(caminho, (100, 2, 'Não confirmado', 0))
+    with open(caminho, 'a', encoding='utf-8') as f:
+        f.write('{"guia": "200", corrompida\n')
+    assert list(indexar(caminho)) == ['100']
+
+
+def test_indexar_sem_arquivo(caminho):
+    assert indexar(caminho) == {}
+
+
+def test_compactar_reescreve_com_uma_linha_por_guia(caminho):
+    gravar(caminho, (100, 2, 'Não confirmado', 0), (100, 2, 'Confirmado 02/02/2024', 1), (200, 3, 'Não confirmado', 0))
+    assert compactar(caminho) == 2
+    registros = list(ler_registros(caminho))
+    assert [(r['guia'], r['qt_confirmada']) for r in registros] == [('100', 1), ('200', 0)]
+    assert not caminho.with_name(caminho.name + '.tmp').exists()
+
+
+def test_compactar_recusa_com_execucao_ativa(caminho):
+    gravar(caminho, (100, 2, 'Não confirmado', 0))
+    em_andamento = RegistroConfirmacoes(caminho, run_id='ativa')
+    try:
+        em_andamento.registrar(100, 2, 'Confirmado 02/02/2024', 1)
+        assert travas_ativas(caminho)
+        with pytest.raises(Exception, match="em uso"):
+            compactar(caminho)
+    finally:
+        em_andamento.fechar()
+    assert not travas_ativas(caminho)
+    # Depois de encerrada, o registro da execução não se perde na compactação
+    assert compactar(caminho) == 1
+    assert indexar(caminho)['100']['run'] == 'ativa'
+
+
+def test_consultar(caminho, capsys):
+    gravar(caminho, (100, 2, 'Confirmado 02/02/2024', 1))
+    assert main(['--arquivo', str(caminho), 'consultar', '100', '999']) == 0
+    saida = capsys.readouterr().out.splitlines()
+    assert saida[0].startswith('100: Confirmado 02/02/2024 (run run,')
+    assert saida[1] == '999: não encontrada'
+
+
+def test_compactar_pela_linha_de_comando_recusa_com_trava(caminho):
+    gravar(caminho, (100, 2, 'Não confirmado', 0))
+    em_andamento = RegistroConfirmacoes(caminho)
+    try:
+        assert main(['--arquivo', str(caminho), 'compactar']) == 1
+        assert main(['--arquivo', str(caminho), 'compactar', '--forcar']) == 0
+    finally:
+        em_andamento.fechar()
+    assert json.loads(caminho.read_text(encoding='utf-8').splitlines()[0])['guia'] == '100'
@@ -0,0 +1,46 @@
+import pytest
+
+from retentativas import FilaRetentativas, classificar_erro, mensagem_erro
+
+
+@pytest.mark.parametrize('mensagem, classe', [
+    ("Número da carteira não encontrado no Excel para a linha atual.", 'dados'),
+    ("Beneficiário divergente: nenhuma sugestão para a carteira 0667000001", 'beneficiario'),
+    ("Message: stale element reference", 'elemento_obsoleto'),
+    ("Elemento 'campo_guia' não encontrado após 3 tentativas", 'timeout'),
+    ("Falha após confirmar o procedimento na posição 2: Message: ", 'pos_confirmacao'),
+    ("", 'desconhecido'),
+])
+def test_classificar_erro(mensagem, classe):
+    assert classificar_erro(mensagem) == classe
+
+
+def test_falha_apos_confirmar_nao_volta_para_a_fila():
+    retentativas = FilaRetentativas(max_tentativas=3, espera_base=0)
+    retentativas.iniciar(0)
+    assert not retentativas.registrar_resultado(0, False, "Falha após confirmar o procedimento na posição 1: Message: ")
+    assert retentativas.proxima_pronta() is None
+    assert retentativas.esgotada()
+
+
+def test_timeout_volta_para_a_fila():
+    retentativas = FilaRetentativas(max_tentativas=3, espera_base=0)
+    retentativas.iniciar(0)
+    assert retentativas.registrar_resultado(0, False, "TimeoutException: Message:")
+    assert retentativas.proxima_pronta() == 0
+
+
+def test_mensagem_erro_de_timeout_sem_msg():
+    from selenium.common.exceptions import TimeoutException
+
+    # Como o WebDriverWait.until levanta quando a espera termina sem mensagem
+    mensagem = mensagem_erro(TimeoutException(''))
+    assert mensagem.startswith('TimeoutException')
+    assert classificar_erro(mensagem) == 'timeout'
+
+
+def test_mensagem_erro_mantem_o_texto():
+    from selenium.common.exceptions import NoSuchElementException
+
+    assert mensagem_erro(NoSuchElementException("Item 2 não encontrado.")).startswith("Item 2 não encontrado.")
+    assert mensagem_erro(Exception("Beneficiário divergente")) == "Beneficiário divergente"
@@ -0,0 +1,104 @@
+import argparse
+import logging
+
+import pandas as pd
+import pytest
+
+from shards import linhas_do_shard, mesclar_resultados, parse_shard, shard_da_guia
+
+pytest.importorskip('openpyxl')
+
+ABA = 'Planilha1'
+
+
+def test_parse_shard():
+    assert parse_shard('1/1') == (1, 1)
+    assert parse_shard('2/3') == (2, 3)
+
+
+@pytest.mark.parametrize('texto', ['0/2', '3/2', '1/0', '1-2', 'a/b', '1/2/3'])
+def test_parse_shard_invalido(texto):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard(texto)
+
+
+def test_shard_invalido_na_linha_de_comando_e_erro_do_argparse(capsys):
+    from version_tree import main
+    with pytest.raises(SystemExit) as saida:
+        main(['executar', '--shard', '3/2'])
+    assert saida.value.code == 2
+    assert "shard inválido '3/2'" in capsys.readouterr().err
+
+
+@pytest.fixture
+def guias():
+    # Guias repetidas, com o mesmo número como inteiro e como float (como o pandas lê do xlsx)
+    return pd.DataFrame({'GUIA_COD': [100, 200, 100, 300, 400, 200, 500, 600, 700, 800]})
+
+
+@pytest.mark.parametrize('total', [1, 2, 3, 5])
+def test_linhas_do_shard_particiona_todas_as_linhas(guias, total):
+    partes = [linhas_do_shard(guias, indice, total) for indice in range(1, total + 1)]
+    assert set().union(*partes) == set(guias.index)
+    assert sum(len(parte) for parte in partes) == len(guias)
+
+
+def test_linhas_da_mesma_guia_ficam_no_mesmo_shard(guias):
+    for indice in (1, 2, 3):
+        parte = linhas_do_shard(guias, indice, 3)
+        assert (0 in parte) == (2 in parte)  # guia 100
+        assert (1 in parte) == (5 in parte)  # guia 200
+
+
+def test_shard_da_guia_e_deterministico():
+    assert shard_da_guia('8097633', 4) == shard_da_guia('8097633', 4)
+    assert 1 <= shard_da_guia('8097633', 4) <= 4
+
+
+def test_shard_igual_para_guia_inteira_ou_float():
+    # O xlsx pode trazer a guia como 100.0; o shard é calculado pelo texto normalizado
+    inteiro = pd.DataFrame({'GUIA_COD': [100, 200]})
+    decimal = pd.DataFrame({'GUIA_COD': [100.0, 200.0]})
+    assert linhas_do_shard(inteiro, 1, 2) == linhas_do_shard(decimal, 1, 2)
+
+
+def escrever(caminho, confirmacoes, erros=None, guias=(100, 200, 300)):
+    pd.DataFrame({
+        'GUIA_COD': list(guias),
+        'CONFIRMACOES': confirmacoes,
+        'ERRO': erros or [None] * len(guias),
+        'QT_CONFIRMADA': [None] * len(guias),
+    }).to_excel(caminho, sheet_name=ABA, index=False)
+    return str(caminho)
+
+
+def test_mesclar_copia_as_linhas_de_cada_shard(tmp_path):
+    mestre = escrever(tmp_path / 'mestre.xlsx', [None, None, None])
+    shard1 = escrever(tmp_path / 's1.xlsx', ['Confirmado 01/02/2024', None, None])
+    shard2 = escrever(tmp_path / 's2.xlsx', [None, None, 'Não confirmado'], erros=[None, 'Timeout', None])
+
+    assert mesclar_resultados(mestre, [shard1, shard2], ABA) == 3
+    resultado = pd.read_excel(mestre, sheet_name=ABA)
+    assert resultado['CONFIRMACOES'].fillna('').tolist() == ['Confirmado 01/02/2024', '', 'Não confirmado']
+    assert resultado['ERRO'].fillna('').tolist() == ['', 'Timeout', '']
+
+
+def test_mesclar_conflito_prevalece_o_ultimo_shard(tmp_path, caplog):
+    mestre = escrever(tmp_path / 'mestre.xlsx', [None, None, None])
+    shard1 = escrever(tmp_path / 's1.xlsx', ['Não confirmado', None, None])
+    shard2 = escrever(tmp_path / 's2.xlsx', ['Confirmado 01/02/2024', None, None])
+
+    with caplog.at_level(logging.WARNING):
+        mesclar_resultados(mestre, [shard1, shard2], ABA)
+    assert '1 linhas' in caplog.text and 's2.xlsx' in caplog.text
+    assert pd.read_excel(mestre, sheet_name=ABA).loc[0, 'CONFIRMACOES'] == 'Confirmado 01/02/2024'
+
+
+def test_mesclar_recusa_planilha_de_outro_tamanho_ou_outras_guias(tmp_path):
+    mestre = escrever(tmp_path / 'mestre.xlsx', [None, None, None])
+    menor = escrever(tmp_path / 'menor.xlsx', [None, None], guias=(100, 200))
+    outras = escrever(tmp_path / 'outras.xlsx', [None, None, None], guias=(100, 200, 999))
+    with pytest.raises(Exception, match='linhas'):
+        mesclar_resultados(mestre, [menor], ABA)
+    with pytest.raises(Exception, match='não correspondem'):
+        mesclar_resultados(mestre, [outras], ABA)
@@ -4,14 +4,40 @@ import time
 import pandas as pd
 import sys
 import os
+import argparse
+import queue
+import re
+import threading
 from pathlib import Path
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from captura_rede import CapturaRede
+from carteirinha import ResolvedorCarteirinha
+from concorrencia import ControladorAIMD, LimitadorTaxa, TravasPorChave
+from cache_planilha import carregar_cache, salvar_cache, tipar_colunas_resultado
+from diferencial import DiferencialExecucao
+from listagem_guias import SCRIPT_EXTRAIR_PAGINA, ListagemGuias, aplicar_listagem
+from localizadores import RegistroLocalizadores
+from metricas import Metricas, rss_navegador
+from modelo_linhas import COLUNAS_ALTERADAS, TabelaLinhas
+from snapshots_dom import BufferSnapshots
+from registro_confirmacoes import RegistroConfirmacoes, REGISTRO_PATH_PADRAO
+from retentativas import FilaRetentativas, mensagem_erro
+from shards import linhas_do_shard, mesclar_resultados, parse_shard
+
+# Planilha padrão, pode ser trocada pela variável de ambiente IPASGO_PLANILHA ou por --planilha
+PLANILHA_PADRAO = os.environ.get('IPASGO_PLANILHA', os.path.join('planilhas', 'Base_confirmação.xlsx'))
+
+# Modais pré-abertos seguidos de outra guia antes de desativar a abertura antecipada no modo pipeline
+MAX_MODAIS_DIVERGENTES = 3
+# Durante a execução a planilha é salva a cada tantas linhas ou segundos, o que vier primeiro; o save final grava o resto
+CHECKPOINT_LINHAS = 25
+CHECKPOINT_SEGUNDOS = 60
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,10 +53,32 @@ def excepthook(exc_type, exc_value, exc_traceback):
 sys.excepthook = excepthook
 
 class DataHandler:
-    def __init__(self, file_path, sheet_name):
+    def __init__(self, file_path, sheet_name, output_path=None,
+                 checkpoint_linhas=CHECKPOINT_LINHAS, checkpoint_segundos=CHECKPOINT_SEGUNDOS):
         self.file_path = file_path
         self.sheet_name = sheet_name
-        self.df = pd.read_excel(file_path, sheet_name=sheet_name)
+        # Por padrão os resultados são salvos na própria planilha de entrada
+        self.output_path = output_path or file_path
+        # Várias sessões do navegador podem atualizar a planilha ao mesmo tempo
+        self.lock = threading.RLock()
+        # Só uma sessão grava o arquivo por vez; a gravação não segura self.lock
+        self.trava_escrita = threading.Lock()
+        self.checkpoint_linhas = checkpoint_linhas
+        self.checkpoint_segundos = checkpoint_segundos
+        self.linhas_sem_save = 0
+        self.ultimo_save = time.monotonic()
+        # Usa o cache colunar quando a planilha não mudou desde a última leitura ou gravação
+        self.df = carregar_cache(file_path, sheet_name)
+        if self.df is not None:
+            self._normalizar_colunas()
+        else:
+            self.df = pd.read_excel(file_path, sheet_name=sheet_name)
+            self._normalizar_colunas()
+            salvar_cache(self.df, file_path, sheet_name)
+        self.reload_rows()
+
+    def _normalizar_colunas(self):
+        """Padroniza os nomes das colunas e cria as colunas de resultado que faltarem."""
         self.df.columns = [col.upper().strip() for col in self.df.columns]
         if 'CONFIRMACOES' not in self.df.columns:
             self.df['CONFIRMACOES'] = ''
@@ -38,11 +86,25 @@ class DataHandler:
             self.df['ERRO'] = ''
         if 'QT_CONFIRMADA' not in self.df.columns:
             self.df['QT_CONFIRMADA'] = ''  # Inicializa com valores vazios ou zero
+        # Mesmo tipo por coluna de resultado vindo do xlsx ou do cache (texto e inteiro anulável)
+        tipar_colunas_resultado(self.df)
+
+    def reload_rows(self):
+        """Remonta o conjunto de linhas em memória a partir do DataFrame."""
+        self.linhas = TabelaLinhas.from_dataframe(self.df)
+
+    def flush_rows(self):
+        """Copia para o DataFrame os resultados gravados nas linhas em memória."""
+        with self.lock:
+            self.linhas.exportar(self.df)
 
     def get_value(self, row_index, column_name):
         """Obtém o valor de uma coluna específica em uma linha específica."""
+        column_name = column_name.upper()
+        if self.linhas.contem(column_name):
+            return self.linhas.valor(row_index, column_name)
         try:
-            value = self.df.at[row_index, column_name.upper()]
+            value = self.df.at[row_index, column_name]
             if pd.isnull(value):
                 return ""
             if isinstance(value, float) and value.is_integer():
@@ -55,7 +117,12 @@ class DataHandler:
     def update_value(self, row_index, column_name, value):
         """Atualiza o valor de uma célula específica."""
         try:
-            self.df.at[row_index, column_name.upper()] = value
+            with self.lock:
+                if column_name.upper() in COLUNAS_ALTERADAS:
+                    # Resultados ficam nas linhas em memória até o próximo save
+                    self.linhas.atualizar(row_index, column_name.upper(), value)
+                else:
+                    self.df.at[row_index, column_name.upper()] = value
             excel_line_number = row_index + 2  # Ajuste para corresponder à linha no Excel
             logging.info(f"Valor atualizado na linha {excel_line_number}, coluna '{column_name}': {value}")
         except KeyError:
@@ -63,20 +130,99 @@ class DataHandler:
 
     def save(self):
         """Salva o DataFrame de volta ao arquivo Excel."""
+        with self.trava_escrita:
+            self._gravar()
+
+    def checkpoint(self):
+        """
+        Conta uma linha processada e salva a planilha quando há linhas ou tempo suficientes desde o último save.
+        Se outra sessão já está gravando, segue sem esperar; o resultado desta linha entra no próximo save.
+        Retorna se a planilha foi salva.
+        """
+        with self.lock:
+            self.linhas_sem_save += 1
+            vencido = (self.linhas_sem_save >= self.checkpoint_linhas
+                       or time.monotonic() - self.ultimo_save >= self.checkpoint_segundos)
+        if not vencido or not self.trava_escrita.acquire(blocking=False):
+            return False
+        try:
+            self._gravar()
+        finally:
+            self.trava_escrita.release()
+        return True
+
+    def _gravar(self):
+        """Grava uma cópia do DataFrame; as outras sessões continuam atualizando as linhas durante a gravação."""
         try:
+            with self.lock:
+                self.flush_rows()
+                # O modo diferencial e as linhas em memória podem deixar '' nas colunas de resultado
+                tipar_colunas_resultado(self.df)
+                df = self.df.copy()
+                self.linhas_sem_save = 0
+                self.ultimo_save = time.monotonic()
             # Salva no mesmo arquivo para evitar problemas
-            self.df.to_excel(self.file_path, sheet_name=self.sheet_name, index=False)
-            logging.info(f"Alterações salvas no arquivo Excel com sucesso: {self.file_path}")
+            df.to_excel(self.output_path, sheet_name=self.sheet_name, index=False)
+            # Atualiza o cache para que a próxima leitura (retomada) não precise reabrir o xlsx
+            salvar_cache(df, self.output_path, self.sheet_name)
+            logging.info(f"Alterações salvas no arquivo Excel com sucesso: {self.output_path}")
         except Exception as e:
             error_message = getattr(e, 'message', str(e))
             logging.error(f"Erro ao salvar o arquivo Excel: {error_message}")
 
 class BaseAutomation:
-    def __init__(self):
+    def __init__(self, captura_rede=False, pasta_snapshots=None, limitador=None, controlador=None, metricas=None):
         """Configurações gerais do WebDriver."""
         self.options = Options()
         self.options.add_argument("--start-maximized")
+        # Captura opcional dos eventos de rede do DevTools Protocol pelo log de performance
+        self.captura_rede = CapturaRede() if captura_rede else None
+        if self.captura_rede:
+            self.options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            self.options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+        # Snapshots do DOM mantidos em memória e gravados apenas quando uma etapa falha
+        self.snapshots = BufferSnapshots(pasta_snapshots) if pasta_snapshots else None
+        # Limitador de taxa e controlador de concorrência compartilhados entre as sessões (opcionais)
+        self.limitador = limitador
+        self.controlador = controlador
+        # Métricas da execução expostas no endpoint HTTP (opcional)
+        self.metricas = metricas
+        self.etapa_atual = None
+        self.linha_etapa = None
+        self.inicio_etapa = None
         self.driver = webdriver.Chrome(options=self.options)
+        # Alvos do portal resolvidos pelo nome, com seletores alternativos e cache por tela
+        self.localizadores = RegistroLocalizadores(self.driver)
+
+    def aguardar_taxa(self, acao):
+        """Aguarda a vez no limitador de taxa compartilhado antes de uma ação no portal."""
+        if self.limitador is not None:
+            self.limitador.adquirir(acao)
+
+    def observar_espera(self, inicio, falhou):
+        """Informa ao controlador de concorrência a duração de uma espera no portal e se ela falhou."""
+        if self.controlador is not None:
+            self.controlador.observar(time.monotonic() - inicio, falhou)
+
+    def contar_retentativa(self, acao):
+        """Conta uma nova tentativa de acesso ou clique nas métricas."""
+        if self.metricas is not None:
+            self.metricas.incrementar('ipasgo_retentativas_total', acao=acao)
+
+    def marcar_etapa(self, etapa, linha=None):
+        """Atribui à etapa anterior as requisições capturadas até agora e inicia a próxima etapa."""
+        agora = time.monotonic()
+        if self.metricas is not None and self.etapa_atual is not None:
+            self.metricas.observar('ipasgo_etapa_duracao_segundos', agora - self.inicio_etapa, etapa=self.etapa_atual)
+        self.etapa_atual, self.linha_etapa, self.inicio_etapa = etapa, linha, agora
+        if self.snapshots is not None and etapa is not None:
+            self.snapshots.capturar(self.driver, etapa, linha)
+        if self.captura_rede is None:
+            return
+        try:
+            self.captura_rede.marcar_etapa(self.driver.get_log('performance'), etapa, linha)
+        except Exception as e:
+            logging.warning(f"Erro ao ler o log de performance do navegador: {e}")
 
     def wait_for_stability(self, timeout=10, check_interval=1):
         """Espera pela estabilidade da altura da página."""
@@ -88,29 +234,45 @@ class BaseAutomation:
                 break
             old_height = new_height
 
+    def resolver_elemento(self, by_locator, timeout):
+        """Espera o elemento ficar clicável; by_locator é um nome do registro de localizadores ou uma tupla (By, seletor)."""
+        if isinstance(by_locator, str):
+            return self.localizadores.localizar(by_locator, timeout=timeout)
+        return WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable(by_locator))
+
     def safe_click(self, by_locator):
         """Tenta clicar no elemento várias vezes se for interceptado."""
-        for _ in range(3):
+        for tentativa in range(3):
+            inicio = time.monotonic()
             try:
-                element = WebDriverWait(self.driver, 5).until(EC.element_to_be_clickable(by_locator))
+                element = self.resolver_elemento(by_locator, 5)
                 element.click()
+                self.observar_espera(inicio, False)
                 logging.info(f"Elemento clicado com sucesso: {by_locator}")
                 return
             except Exception as e:
+                self.observar_espera(inicio, True)
                 error_message = getattr(e, 'msg', str(e))
                 logging.warning(f"Erro ao clicar no elemento: {error_message}")
+                if tentativa < 2:
+                    self.contar_retentativa('clique')
                 time.sleep(1)
         raise Exception("Não foi possível clicar no elemento após várias tentativas.")
 
     def acessar_com_reattempt(self, by_locator, attempts=3):
         """Tenta acessar um elemento várias vezes."""
         for attempt in range(attempts):
+            inicio = time.monotonic()
             try:
-                element = WebDriverWait(self.driver, 10).until(EC.element_to_be_clickable(by_locator))
+                element = self.resolver_elemento(by_locator, 10)
+                self.observar_espera(inicio, False)
                 logging.info(f"Elemento encontrado: {by_locator}")
                 return element
             except TimeoutException:
+                self.observar_espera(inicio, True)
                 logging.warning(f"Tentativa {attempt + 1} falhou. Tentando novamente...")
+                if attempt < attempts - 1:
+                    self.contar_retentativa('acesso')
                 time.sleep(1)
         raise Exception(f"Não foi possível acessar o elemento após {attempts} tentativas.")
 
@@ -121,13 +283,21 @@ class BaseAutomation:
         element.click()
 
 class VerificationIPASGO(BaseAutomation):
-    def __init__(self, data_handler):
-        super().__init__()
+    def __init__(self, data_handler, registro_path=REGISTRO_PATH_PADRAO, modo_pipeline=False, captura_rede=False,
+                 pasta_snapshots=None, limitador=None, controlador=None, metricas=None):
+        super().__init__(captura_rede, pasta_snapshots, limitador, controlador, metricas)
         self.data_handler = data_handler
         self.row_index = 0  # Inicie com o índice desejado
+        self.last_guia = None  # Última guia localizada no portal
 
-        # Caminho para o arquivo txt onde as confirmações serão salvas
-        self.txt_file_path = r"C:\Users\SUPERVISÃO ADM\Desktop\RPA_verificação_ipasgo\salvamento_datas_confirmação.txt"
+        # Modo pipeline: uma segunda aba do WebPlan pesquisa a próxima guia enquanto a atual é confirmada
+        self.modo_pipeline = modo_pipeline
+        self.proxima_linha = None  # Índice da próxima linha planejada, definido pelo laço principal
+        self.guia_por_aba = {}  # Aba -> guia pesquisada nela
+        self.modal_preparado = set()  # Abas com o modal da guia pesquisada já aberto
+        self.preabrir_modal = True  # Desativado se o modal não permitir conferir a guia
+        self.modais_divergentes = 0  # Modais pré-abertos seguidos que não eram da guia da linha
+        self.icone_anterior = {}  # Aba -> ícone do resultado exibido antes da última pesquisa (None se não havia)
 
         # Obter as credenciais das variáveis de ambiente
         self.username = os.environ.get('IPASGO_USERNAME')
@@ -135,19 +305,53 @@ class VerificationIPASGO(BaseAutomation):
         if not self.username or not self.password:
             raise Exception("As credenciais não foram encontradas nas variáveis de ambiente.")
 
+        # Registro das confirmações capturadas, aberto uma única vez para toda a execução
+        # (pode ser um registro já aberto, compartilhado entre sessões)
+        if isinstance(registro_path, RegistroConfirmacoes):
+            self.registro = registro_path
+        else:
+            self.registro = RegistroConfirmacoes(registro_path)
+
+        # Seleção do beneficiário no autocomplete da carteira, com cache por carteira durante a execução
+        self.carteirinhas = ResolvedorCarteirinha(self)
+
+    def esquecer_guias_pesquisadas(self):
+        """Força uma nova pesquisa da guia na próxima linha; usado nas retentativas, quando a tela pode ter ficado num estado qualquer."""
+        self.last_guia = None
+        self.proxima_linha = None
+        self.guia_por_aba.clear()
+        self.modal_preparado.clear()
+        self.icone_anterior.clear()
+
+    def despejar_snapshots(self, motivo):
+        """
+        Grava os snapshots do DOM da linha atual, incluindo o estado no momento da falha.
+        Chamado uma única vez por linha com falha, em executar_fluxo_para_linha; as etapas só repassam o erro.
+        """
+        if self.snapshots is None:
+            return
+        excel_line_number = self.row_index + 2
+        self.snapshots.capturar(self.driver, 'falha', excel_line_number)
+        self.snapshots.despejar(motivo, excel_line_number, self.linha_atual.guia_cod)
+
+    @property
+    def linha_atual(self):
+        """Linha em memória (já normalizada) correspondente a row_index."""
+        return self.data_handler.linhas[self.row_index]
+
     def acessar_portal_ipasgo(self):
         """Executa o fluxo de login no portal IPASGO."""
         try:
             self.driver.get("https://portalos.ipasgo.go.gov.br/Portal_Dominio/PrestadorLogin.aspx")
             self.wait_for_stability(timeout=10)
 
-            matricula_input = self.acessar_com_reattempt((By.ID, "SilkUIFramework_wt13_block_wtUsername_wtUserNameInput2"))
+            matricula_input = self.acessar_com_reattempt('login_usuario')
             matricula_input.send_keys(self.username)
 
-            senha_input = self.acessar_com_reattempt((By.ID, "SilkUIFramework_wt13_block_wtPassword_wtPasswordInput"))
+            senha_input = self.acessar_com_reattempt('login_senha')
             senha_input.send_keys(self.password)
 
-            self.safe_click((By.ID, "SilkUIFramework_wt13_block_wtAction_wtLoginButton"))
+            self.safe_click('login_botao')
 
             # Verificar se o alerta está dentro de um iframe (opcional)
             try:
@@ -172,15 +376,13 @@ class VerificationIPASGO(BaseAutomation):
 
             self.wait_for_stability(timeout=10)
 
-            link_portal_webplan = self.acessar_com_reattempt(
-                (By.XPATH, "//*[@id='IpasgoTheme_wt16_block_wtMainContent_wtSistemas_ctl08_SilkUIFramework_wt36_block_wtActions_wtModulos_SilkUIFramework_wt9_block_wtContent_wtModuloPortalTable_ctl04_wt2']/span")
-            )
+            link_portal_webplan = self.acessar_com_reattempt('link_webplan')
             self.scroll_and_click(link_portal_webplan)
 
             WebDriverWait(self.driver, 20).until(EC.number_of_windows_to_be(2))
             self.driver.switch_to.window(self.driver.window_handles[1])
 
-            self.acessar_com_reattempt((By.ID, "menuPrincipal"))
+            self.acessar_com_reattempt('menu_principal')
 
             time.sleep(4)
             logging.info("Login realizado com sucesso.")
@@ -188,6 +390,9 @@ class VerificationIPASGO(BaseAutomation):
             # Chamar localizar_procedimentos apenas uma vez, como parte do login
             self.localizar_procedimentos()
 
+            if self.modo_pipeline:
+                self.abrir_aba_pipeline()
+
         except Exception as e:
             error_message = getattr(e, 'msg', str(e))
             logging.error(f"Erro ao acessar o portal IPASGO: {error_message}")
@@ -200,7 +405,7 @@ class VerificationIPASGO(BaseAutomation):
         """Função para localizar e clicar no elemento 'localizar-procedimentos'."""
         try:
             logging.info("Localizando o menu de procedimentos.")
-            procedimentos_button = self.acessar_com_reattempt((By.CSS_SELECTOR, ".localizar-procedimentos-icon"))
+            procedimentos_button = self.acessar_com_reattempt('menu_localizar_procedimentos')
             self.scroll_and_click(procedimentos_button)
             time.sleep(5)
 
@@ -215,11 +420,159 @@ class VerificationIPASGO(BaseAutomation):
             self.data_handler.save()
             raise
 
+    def abrir_aba_pipeline(self):
+        """Abre uma segunda aba do WebPlan na mesma sessão, já na tela de localizar procedimentos."""
+        aba_principal = self.driver.current_window_handle
+        try:
+            url_webplan = self.driver.current_url
+            self.driver.switch_to.new_window('tab')
+            self.driver.get(url_webplan)
+            self.acessar_com_reattempt('menu_principal')
+            self.localizar_procedimentos()
+            self.abas_pipeline = [aba_principal, self.driver.current_window_handle]
+            self.driver.switch_to.window(aba_principal)
+            logging.info("Segunda aba do WebPlan aberta para o modo pipeline.")
+        except Exception as e:
+            error_message = getattr(e, 'msg', str(e))
+            logging.error(f"Erro ao abrir a segunda aba, o modo pipeline será desativado: {error_message}")
+            self.modo_pipeline = False
+            self.driver.switch_to.window(aba_principal)
+
+    def outra_aba(self):
+        """Retorna a aba do pipeline que não é a atual."""
+        atual = self.driver.current_window_handle
+        return next(aba for aba in self.abas_pipeline if aba != atual)
+
+    def trocar_para_aba_da_guia(self, numero_guia):
+        """Passa para a outra aba se a guia já foi pesquisada nela; ajusta last_guia para a aba em uso."""
+        outra = self.outra_aba()
+        atual = self.driver.current_window_handle
+        if self.guia_por_aba.get(atual) != numero_guia and self.guia_por_aba.get(outra) == numero_guia:
+            self.driver.switch_to.window(outra)
+            logging.info(f"Guia {numero_guia} já pesquisada na outra aba. Trocando de aba.")
+        self.last_guia = self.guia_por_aba.get(self.driver.current_window_handle)
+
+    def resultado_mostra_guia(self, aba, numero_guia):
+        """Indica se a lista de resultados da aba atual já é a da guia pesquisada, e não a da pesquisa anterior."""
+        alvo = re.sub(r'\D', '', str(numero_guia)).lstrip('0')
+        guias = {item['guia'].lstrip('0') for item in self.driver.execute_script(SCRIPT_EXTRAIR_PAGINA) or []}
+        if guias:
+            return alvo in guias
+        # Sem o número da guia legível na lista, vale o ícone do resultado anterior ter saído da tela
+        anterior = self.icone_anterior.get(aba)
+        if anterior is None:
+            return True
+        try:
+            anterior.is_enabled()
+            return False
+        except StaleElementReferenceException:
+            return True
+
+    def aguardar_resultado_da_guia(self, numero_guia, timeout):
+        """Espera a aba atual mostrar o resultado da guia pesquisada; lança TimeoutException se não mostrar."""
+        aba = self.driver.current_window_handle
+        WebDriverWait(self.driver, timeout, poll_frequency=0.2).until(
+            lambda driver: self.resultado_mostra_guia(aba, numero_guia),
+            f"O resultado da guia {numero_guia} não apareceu na aba após {timeout}s.",
+        )
+        self.icone_anterior.pop(aba, None)
+
+    def modal_da_guia(self, modal, numero_guia):
+        """
+        Confere pelo texto do modal de confirmação se ele é o da guia informada.
+        Retorna None se o modal não mostrar nenhum número com o tamanho de um número de guia.
+        """
+        alvo = re.sub(r'\D', '', str(numero_guia)).lstrip('0')
+        # Números do modal, fora as datas, sem a pontuação de milhar e sem zeros à esquerda
+        texto = re.sub(r'\d{1,2}/\d{1,2}/\d{2,4}', ' ', modal.text)
+        numeros = {numero.lstrip('0') for numero in re.findall(r'\d+', re.sub(r'(?<=\d)[.\-](?=\d)', '', texto))}
+        if not any(len(numero) == len(alvo) for numero in numeros):
+            return None
+        return bool(alvo) and alvo in numeros
+
+    def desativar_preabertura(self, motivo):
+        """Deixa de abrir o modal antecipadamente na outra aba; a pesquisa antecipada continua."""
+        self.preabrir_modal = False
+        logging.warning(f"Abertura antecipada do modal desativada: {motivo}.")
+
+    def fechar_modal_confirmacao(self, modal):
+        """Fecha o modal de confirmação aberto (tecla ESC) e espera ele sair da tela."""
+        self.driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
+        try:
+            WebDriverWait(self.driver, 5).until(EC.invisibility_of_element(modal))
+        except TimeoutException:
+            logging.warning("O modal de confirmação não fechou com ESC.")
+        self.localizadores.invalidar('modal_confirmacao')
+
+    def preparar_proxima_guia(self):
+        """Pesquisa a guia da próxima linha na outra aba, sem esperar o resultado."""
+        if not self.modo_pipeline or self.proxima_linha is None:
+            return
+        proxima_guia = self.data_handler.linhas[self.proxima_linha].guia_cod
+        atual = self.driver.current_window_handle
+        outra = self.outra_aba()
+        # A mesma guia continua nesta aba, ou a outra aba já está pronta
+        if proxima_guia in (self.guia_por_aba.get(atual), self.guia_por_aba.get(outra)):
+            return
+        # Chamada no meio da confirmação: a espera do status e as requisições seguintes continuam sendo dela
+        etapa_anterior, linha_anterior = self.etapa_atual, self.linha_etapa
+        try:
+            self.marcar_etapa('preparar_proxima_guia', self.proxima_linha + 2)
+            self.driver.switch_to.window(outra)
+            self.guia_por_aba[outra] = None
+            self.modal_preparado.discard(outra)
+            guia_input = self.acessar_com_reattempt('campo_guia')
+            guia_input.clear()
+            guia_input.send_keys(str(proxima_guia))
+            # O resultado ainda na tela é o da guia anterior; serve para saber quando a nova pesquisa terminou
+            self.icone_anterior[outra] = self.localizadores.procurar('abrir_confirmacao')
+            self.aguardar_taxa('pesquisa')
+            self.localizadores.executar('botao_pesquisar_guia', lambda botao: botao.click())
+            # O resultado anterior deixa de valer para esta aba
+            self.localizadores.invalidar('abrir_confirmacao')
+            self.guia_por_aba[outra] = proxima_guia
+            logging.info(f"Guia {proxima_guia} pesquisada antecipadamente na outra aba.")
+        except Exception as e:
+            error_message = getattr(e, 'msg', str(e))
+            logging.warning(f"Não foi possível pesquisar a próxima guia na outra aba: {error_message}")
+        finally:
+            self.driver.switch_to.window(atual)
+            self.marcar_etapa(etapa_anterior, linha_anterior)
+
+    def abrir_modal_proxima_guia(self):
+        """Abre na outra aba o modal da guia pesquisada antecipadamente, se o resultado já estiver na tela."""
+        if not self.modo_pipeline or not self.preabrir_modal:
+            return
+        atual = self.driver.current_window_handle
+        outra = self.outra_aba()
+        if self.guia_por_aba.get(outra) is None or outra in self.modal_preparado:
+            return
+        try:
+            self.driver.switch_to.window(outra)
+            proxima_guia = self.guia_por_aba[outra]
+            # Espera curta: se a pesquisa ainda não terminou, o modal é aberto normalmente depois.
+            # Sem ela o ícone encontrado seria o do resultado anterior, de outra guia.
+            try:
+                self.aguardar_resultado_da_guia(proxima_guia, timeout=2)
+            except TimeoutException:
+                logging.info(f"Resultado da guia {proxima_guia} ainda não está na outra aba; o modal será aberto depois.")
+                return
+            icone = self.localizadores.procurar('abrir_confirmacao')
+            if icone is not None:
+                icone.click()
+                self.modal_preparado.add(outra)
+                logging.info(f"Modal da guia {proxima_guia} aberto antecipadamente na outra aba.")
+        except Exception as e:
+            error_message = getattr(e, 'msg', str(e))
+            logging.warning(f"Não foi possível abrir o modal na outra aba: {error_message}")
+        finally:
+            self.driver.switch_to.window(atual)
+
     def close_alert_if_present(self):
         """Fecha o alerta se estiver presente."""
         try:
             logging.info("Verificando se o alerta está presente.")
-            alerta = WebDriverWait(self.driver, 2).until(EC.visibility_of_element_located((By.XPATH, '//*[@id="button-1"]')))
+            alerta = self.localizadores.localizar('alerta_login', EC.visibility_of_element_located, timeout=2)
             alerta.click()
             logging.info("Alerta fechado com sucesso.")
         except TimeoutException:
@@ -228,10 +581,16 @@ class VerificationIPASGO(BaseAutomation):
 
 
     def executar_fluxo_para_linha(self):
-        """Executa o fluxo de interações para a linha atual, com a lógica do guia repetido."""
+        """Executa o fluxo de interações para a linha atual, com a lógica do guia repetido. Retorna True se não houve erro."""
+        # Os status capturados valem só para esta linha
+        self.confirmation_status_list = []
         try:
             # Obter o número da guia desta linha
-            numero_guia = self.data_handler.get_value(self.row_index, 'GUIA_COD')
+            numero_guia = self.linha_atual.guia_cod
+            excel_line_number = self.row_index + 2
+
+            if self.modo_pipeline:
+                self.trocar_para_aba_da_guia(numero_guia)
 
             # Verifica se o número da guia desta linha é o mesmo da linha anterior
             if numero_guia == self.last_guia:
@@ -239,41 +598,74 @@ class VerificationIPASGO(BaseAutomation):
                 logging.info(f"Guia {numero_guia} já foi localizada anteriormente. Pulando 'Guia_operadora()'.")
             else:
                 # Se for diferente, chamamos Guia_operadora para filtrar a nova guia
+                if self.modo_pipeline:
+                    self.guia_por_aba[self.driver.current_window_handle] = None
+                    self.modal_preparado.discard(self.driver.current_window_handle)
+                self.marcar_etapa('Guia_operadora', excel_line_number)
                 self.Guia_operadora()
 
             # Fluxo normal de confirmação
+            self.marcar_etapa('abrir_confirmar_procedimentos', excel_line_number)
             self.abrir_confirmar_procedimentos()
+            self.marcar_etapa('Clicar_confirmar_procedimento', excel_line_number)
             self.Clicar_confirmar_procedimento()
+            self.registrar_confirmacoes()
+            # Sem procedimento a confirmar a próxima guia ainda não foi pesquisada
+            self.preparar_proxima_guia()
+            self.abrir_modal_proxima_guia()
+            self.marcar_etapa('fechar_alerta_notificacao', excel_line_number)
             self.fechar_alerta_notificacao()
 
             # Após concluir a confirmação (fechar_alerta_notificacao), atualizamos o last_guia
             self.last_guia = numero_guia
+            if self.modo_pipeline:
+                self.guia_por_aba[self.driver.current_window_handle] = numero_guia
 
             # Agora executa o scroll para preparar o próximo número de guia
+            self.marcar_etapa('scroll_into_view', excel_line_number)
             self.scroll_into_view()
+            return True
 
         except Exception as e:
-            error_message = getattr(e, 'msg', str(e))
+            error_message = mensagem_erro(e)
             logging.error(f"Erro ao executar o fluxo na linha {self.row_index + 2}: {error_message}")
+            self.despejar_snapshots(error_message)
             # Atualizar a coluna 'ERRO' no Excel
             self.data_handler.update_value(self.row_index, 'ERRO', error_message)
-            self.data_handler.save()
+            # A tela pode ter ficado no meio da etapa: a próxima linha pesquisa a guia de novo
+            self.esquecer_guias_pesquisadas()
+            return False
+
 
 
+    def registrar_confirmacoes(self):
+        """Grava no registro um único status por linha, já com o resultado da confirmação."""
+        status_list = getattr(self, 'confirmation_status_list', None)
+        if not status_list:
+            return
+        confirmacoes_texto = "; ".join(status_list)
+        qt_confirmada = sum(1 for status in status_list if status.startswith('Confirmado'))
+        self.registro.registrar(self.linha_atual.guia_cod, self.row_index + 2, confirmacoes_texto, qt_confirmada)
+        logging.info(f"Confirmações registradas em '{self.registro.path}'.")
 
     def Guia_operadora(self):
         """Função para inserir o número da guia para localizar procedimento usando dados da planilha."""
         try:
-            numero_guia = self.data_handler.get_value(self.row_index, 'GUIA_COD')
+            numero_guia = self.linha_atual.guia_cod
             logging.info("Localizando o campo de número da guia.")
 
-            guia_input = self.acessar_com_reattempt((By.CSS_SELECTOR, 'div.input-group > input.form-control.small'))
+            guia_input = self.acessar_com_reattempt('campo_guia')
             guia_input.clear()
             guia_input.send_keys(str(numero_guia))
             logging.info(f"Número da guia preenchido com sucesso: {numero_guia}")
 
-            search_button = self.acessar_com_reattempt((By.XPATH, "//div[contains(@class, 'input-group')]//span[contains(@class, 'fa-search') and contains(@class, 'pointer')]"))
+            search_button = self.acessar_com_reattempt('botao_pesquisar_guia')
+            if self.modo_pipeline:
+                self.icone_anterior[self.driver.current_window_handle] = self.localizadores.procurar('abrir_confirmacao')
+            self.aguardar_taxa('pesquisa')
             search_button.click()
+            # O ícone do resultado anterior não vale para a nova pesquisa
+            self.localizadores.invalidar('abrir_confirmacao')
 
             time.sleep(2)
 
@@ -283,13 +675,39 @@ class VerificationIPASGO(BaseAutomation):
         except Exception as e:
             error_message = getattr(e, 'msg', str(e))
             logging.error(f"Erro ao preencher o número da guia: {error_message}")
-            # Não atualizar a coluna 'ERRO' no Excel
+            # A coluna 'ERRO' é atualizada pelo fluxo da linha, que a devolve para a fila de retentativas
+            raise
 
     def abrir_confirmar_procedimentos(self):
         """Função para confirmar procedimentos executados."""
         try:
             logging.info("Iniciando o processo de confirmação dos procedimentos.")
-            confirmar_button = self.acessar_com_reattempt((By.XPATH, '//*[@id="localizarprocedimentos"]/div[2]/div/div[2]/div/div[2]/div[1]/div/div/div/div[2]/div[2]/div/div[1]/div/div[1]/div[2]/div/i[2]'))
+            numero_guia = self.linha_atual.guia_cod
+            aba = self.driver.current_window_handle if self.modo_pipeline else None
+            if aba in self.modal_preparado:
+                self.modal_preparado.discard(aba)
+                modal = self.localizadores.procurar('modal_confirmacao')
+                if modal is not None:
+                    da_guia = self.modal_da_guia(modal, numero_guia)
+                    if da_guia:
+                        self.modais_divergentes = 0
+                        logging.info("Modal de confirmação já aberto pelo pré-carregamento da aba.")
+                        self.capturar_data_procedimentos()
+                        return
+                    # O modal pré-aberto não é (ou não dá para conferir se é) o desta guia: fecha e pesquisa de novo
+                    logging.info(f"Modal pré-aberto na aba não é o da guia {numero_guia}. Pesquisando a guia novamente.")
+                    self.modais_divergentes += 1
+                    if da_guia is None:
+                        self.desativar_preabertura("o modal não mostra um número de guia legível")
+                    elif self.modais_divergentes >= MAX_MODAIS_DIVERGENTES:
+                        self.desativar_preabertura(f"{self.modais_divergentes} modais seguidos de outra guia")
+                    self.fechar_modal_confirmacao(modal)
+                    self.Guia_operadora()
+            if aba in self.icone_anterior:
+                # A pesquisa feita nesta aba pode ainda estar mostrando o resultado anterior
+                self.aguardar_resultado_da_guia(numero_guia, timeout=10)
+            confirmar_button = self.acessar_com_reattempt('abrir_confirmacao')
+            self.aguardar_taxa('modal')
             confirmar_button.click()
             logging.info("Botão de confirmação clicado com sucesso.")
             time.sleep(2)
@@ -297,7 +715,8 @@ class VerificationIPASGO(BaseAutomation):
         except Exception as e:
             error_message = getattr(e, 'msg', str(e))
             logging.error(f"Erro ao tentar confirmar os procedimentos: {error_message}")
-            # Não atualizar a coluna 'ERRO' no Excel
+            # A coluna 'ERRO' é atualizada pelo fluxo da linha, que a devolve para a fila de retentativas
+            raise
 
     def capturar_data_procedimentos(self):
         """Captura os textos de confirmação dos procedimentos exibidos no modal e salva em uma lista."""
@@ -305,13 +724,11 @@ class VerificationIPASGO(BaseAutomation):
             logging.info("Iniciando captura de confirmações dos procedimentos.")
 
             # Aguardando a presença do modal
-            modal = WebDriverWait(self.driver, 10).until(
-                EC.visibility_of_element_located((By.ID, 'confirmar-procedimentos-modal'))
-            )
+            modal = self.localizadores.localizar('modal_confirmacao', EC.visibility_of_element_located, timeout=10)
             logging.info("Modal de confirmação está visível.")
 
             # Localiza todos os itens de confirmação dentro do modal
-            confirmacao_itens = modal.find_elements(By.XPATH, '//*[@id="confirmar-procedimentos-modal"]/div/div/div[2]/div[2]/div/div[2]/div/div')
+            confirmacao_itens = self.localizadores.localizar_todos('itens_confirmacao', modal)
 
             self.confirmation_status_list = []  # Inicializa a lista para armazenar os status
 
@@ -331,19 +748,11 @@ class VerificationIPASGO(BaseAutomation):
             self.data_handler.update_value(self.row_index, 'QT_CONFIRMADA', qt_confirmada)
             logging.info(f"Número de procedimentos confirmados: {qt_confirmada}")
 
-            self.data_handler.save()
-
-            # Escreve as confirmações no arquivo .txt
-            with open(self.txt_file_path, 'a', encoding='utf-8') as f:
-                excel_line_number = self.row_index + 2
-                f.write(f"Linha {excel_line_number}: {confirmacoes_texto}\n")
-
-            logging.info(f"Confirmações capturadas e salvas em '{self.txt_file_path}'.")
-
             # Chama a função para processar os procedimentos não confirmados
 
         except Exception as e:
             logging.error(f"Erro ao capturar confirmações: {e}")
+            raise
 
 
 
@@ -366,11 +775,13 @@ class VerificationIPASGO(BaseAutomation):
                 logging.info(f"Status do procedimento na posição {position}: '{status_text}'")
 
                 if status_text == "Não confirmado":
-                    # Construir o XPath para o item na posição correspondente
-                    item_xpath = f'//*[@id="confirmar-procedimentos-modal"]/div/div/div[2]/div[2]/div/div[2]/div/div[{position}]'
+                    confirmar_clicado = False
                     try:
-                        # Localizar o item correspondente
-                        item = self.driver.find_element(By.XPATH, item_xpath)
+                        # Localizar o item na posição correspondente
+                        itens = self.localizadores.localizar_todos('itens_confirmacao')
+                        if len(itens) < position:
+                            raise NoSuchElementException(f"Item {position} do modal de confirmação não encontrado.")
+                        item = itens[idx]
                         logging.info(f"Procedimento na posição {position} não está confirmado. Confirmando agora...")
 
                         # Dentro desse item, localizar o elemento para clicar
@@ -392,41 +803,33 @@ class VerificationIPASGO(BaseAutomation):
                             logging.info("Tentando localizar o campo de número da carteira após a confirmação.")
 
                             # Aguarde até que o campo esteja visível
-                            campo_carteira = WebDriverWait(self.driver, 10).until(
-                                EC.visibility_of_element_located((By.XPATH, '//*[@id="numeroDaCarteiraConfirmacao"]'))
-                            )
+                            campo_carteira = self.localizadores.localizar('campo_carteira', EC.visibility_of_element_located, timeout=10)
                             logging.info("Campo 'numeroDaCarteiraConfirmacao' localizado com sucesso.")
 
                             # Obter o valor da coluna "CARTEIRINHA" do Excel para a linha atual
-                            numero_carteira = self.data_handler.get_value(self.row_index, 'CARTEIRINHA')
+                            numero_carteira = self.linha_atual.carteirinha
                             if not numero_carteira:
                                 raise Exception("Número da carteira não encontrado no Excel para a linha atual.")
 
-                            # Preencher o campo com o valor extraído do Excel
-                            campo_carteira.send_keys(numero_carteira)
-
+                            # Preencher o campo e escolher a sugestão do beneficiário da planilha
+                            self.carteirinhas.resolver(campo_carteira, numero_carteira, self.linha_atual.paciente)
                             logging.info(f"Campo 'numeroDaCarteiraConfirmacao' preenchido com o valor: {numero_carteira}")
 
-                            # Aguarde 1 segundo
-                            time.sleep(1)
-
-                            # Simular a seta para baixo e pressionar Enter
-                            campo_carteira.send_keys(Keys.ARROW_DOWN)
-                            campo_carteira.send_keys(Keys.ENTER)
-                            logging.info("Seta para baixo e Enter pressionados para selecionar a opção correta.")
-
                             # Localizar e clicar no botão "Confirmar"
-                            botao_confirmar = WebDriverWait(self.driver, 10).until(
-                                EC.element_to_be_clickable((By.XPATH, '//*[@id="indentificar-confirmar-procedimentos-modal"]/div/div/div[3]/div/button[2]'))
-                            )
+                            botao_confirmar = self.localizadores.localizar('botao_confirmar_identificacao', timeout=10)
+                            self.marcar_etapa('botao_confirmar', self.row_index + 2)
+                            self.aguardar_taxa('confirmar')
                             botao_confirmar.click()
+                            confirmar_clicado = True
                             logging.info("Botão de confirmação clicado com sucesso após preencher o número da carteira.")
 
+                            # Enquanto o portal processa a confirmação, pesquisa a próxima guia na outra aba
+                            self.preparar_proxima_guia()
+
                         except Exception as e:
                             logging.error(f"Erro ao interagir com o campo 'numeroDaCarteiraConfirmacao': {e}")
-                            # Atualizar a coluna 'ERRO' no Excel com a mensagem de erro
-                            self.data_handler.update_value(self.row_index, 'ERRO', f"Erro no campo 'numeroDaCarteiraConfirmacao': {e}")
-                            self.data_handler.save()
+                            # A mensagem vai para a coluna 'ERRO' pelo fluxo da linha; sem a carteira o status não muda
+                            raise Exception(f"Erro no campo 'numeroDaCarteiraConfirmacao': {e}") from e
 
                         # Opcional: Após as interações adicionais, você pode atualizar o status
                         # Aguardar até que o status mude para "Confirmado {data}"
@@ -436,15 +839,20 @@ class VerificationIPASGO(BaseAutomation):
                         )
                         updated_status = status_element.text.strip()
                         logging.info(f"Novo status do procedimento na posição {position}: {updated_status}")
+                        if self.metricas is not None:
+                            self.metricas.incrementar('ipasgo_guias_confirmadas_total')
 
                         # Atualizar o status na lista
                         self.confirmation_status_list[idx] = updated_status
 
                     except Exception as e:
                         logging.error(f"Erro ao confirmar o procedimento na posição {position}: {e}")
-                        # Decida se deseja continuar ou não
-                        # Neste caso, como só processamos o primeiro, podemos sair do loop
-                        break
+                        if confirmar_clicado:
+                            # O portal pode ter confirmado mesmo sem o status mudar a tempo; a classe 'pos_confirmacao'
+                            # não volta para a fila, porque repetir a linha confirmaria o procedimento de novo
+                            raise Exception(f"Falha após confirmar o procedimento na posição {position}: {mensagem_erro(e)}") from e
+                        # O procedimento continua pendente: a linha falha e volta para a fila de retentativas
+                        raise
 
                     # Após processar o primeiro "Não confirmado", interromper o loop
                     break
@@ -456,11 +864,10 @@ class VerificationIPASGO(BaseAutomation):
             # Atualizar a coluna 'CONFIRMACOES' no Excel após a confirmação
             confirmacoes_texto = "; ".join(self.confirmation_status_list)
             self.data_handler.update_value(self.row_index, 'CONFIRMACOES', confirmacoes_texto)
-            self.data_handler.save()
 
         except Exception as e:
             logging.error(f"Erro ao processar o procedimento não confirmado: {e}")
-            return
+            raise
 
 
 
@@ -473,16 +880,16 @@ class VerificationIPASGO(BaseAutomation):
             # Esperar um tempo fixo conhecido antes de tentar encontrar o alerta
             time.sleep(1.5)  
             # Tentar localizar o elemento de modo fixo considerando que ele já exista
-            alerta_close_button = self.driver.find_element(By.XPATH, "//i[contains(@class, 'fa-times') and contains(@class, 'close')]")
+            alerta_close_button = self.localizadores.procurar('fechar_alerta_notificacao')
+            if alerta_close_button is None:
+                raise NoSuchElementException("Alerta de notificação não encontrado.")
             alerta_close_button.click()
             logging.info("Alerta de notificação fechado com sucesso na tentativa inicial.")
         except NoSuchElementException:
             logging.info("Alerta de notificação não encontrado na tentativa inicial. Tentando novamente com WebDriverWait.")
             try:
                 # Se não encontrado, tentar novamente usando WebDriverWait que irá esperar o elemento está presente
-                alerta_close_button = WebDriverWait(self.driver, 2).until(
-                    EC.element_to_be_clickable((By.XPATH, "//i[contains(@class, 'fa-times') and contains(@class, 'close')]"))
-                )
+                alerta_close_button = self.localizadores.localizar('fechar_alerta_notificacao', timeout=2)
                 alerta_close_button.click()
                 logging.info("Alerta de notificação fechado com sucesso após usar WebDriverWait.")
             except TimeoutException:
@@ -504,48 +911,305 @@ class VerificationIPASGO(BaseAutomation):
         except Exception as e:
             logging.error(f"Erro ao executar scrollIntoView: {e}")
 
-# Exemplo de execução
-if __name__ == "__main__":
-    # Defina o caminho do arquivo e o nome da planilha
-    file_path = r"C:\Users\SUPERVISÃO ADM\Desktop\RPA_verificação_ipasgo\planilhas\Base_confirmação.xlsx"
-    sheet_name = 'Planilha1'
+def processar_linha(automacao, data_handler, idx, retentativas, sessao=1):
+    """
+    Executa o fluxo de uma linha e registra o resultado, ou o erro na planilha se falhar.
+    Linhas com erro voltam para a fila de retentativas; no sucesso a coluna ERRO fica vazia.
+    """
+    automacao.row_index = idx
+    excel_line_number = idx + 2  # Para correspondência com a linha do Excel
+    tentativa = retentativas.iniciar(idx)
+    logging.info(f"Iniciando o processamento da linha {excel_line_number} (tentativa {tentativa})")
+    inicio = time.monotonic()
+    # Limpa o erro de uma tentativa anterior; se a linha falhar de novo, o fluxo grava o novo erro
+    if data_handler.get_value(idx, 'ERRO'):
+        data_handler.update_value(idx, 'ERRO', '')
+
+    try:
+        sucesso = automacao.executar_fluxo_para_linha()
+        # Algumas etapas gravam o erro sem interromper o fluxo
+        sucesso = sucesso and not data_handler.get_value(idx, 'ERRO')
+    except Exception as e:
+        sucesso = False
+        error_message = mensagem_erro(e)
+        logging.error(f"Erro ao processar a linha {excel_line_number}: {error_message}")
+        # Atualiza a coluna 'ERRO' no Excel
+        data_handler.update_value(idx, 'ERRO', error_message)
+        # Continue para a próxima linha
+    # Salva a cada tantas linhas ou segundos, não a cada linha; o fim da execução salva o restante
+    data_handler.checkpoint()
+
+    if automacao.metricas is not None:
+        # Encerra a última etapa da linha para que o salvamento não conte como parte dela
+        automacao.marcar_etapa(None)
+        automacao.metricas.linha_concluida(sucesso, time.monotonic() - inicio)
+        rss = rss_navegador(automacao.driver)
+        if rss is not None:
+            automacao.metricas.definir('ipasgo_navegador_rss_bytes', rss, sessao=sessao)
+
+    reagendada = retentativas.registrar_resultado(idx, sucesso, data_handler.get_value(idx, 'ERRO'))
+    if reagendada and automacao.metricas is not None:
+        automacao.metricas.linha_reagendada()
+
+
+def processar_retentativa(automacao, data_handler, retentativas, sessao=1, travas=None):
+    """
+    Processa a próxima linha da fila de retentativas cuja espera já terminou. Retorna se havia alguma.
+    Com várias sessões, espera a trava da guia para não confirmar junto com a sessão que processa as outras linhas dela.
+    """
+    idx = retentativas.proxima_pronta()
+    if idx is None:
+        return False
+    automacao.esquecer_guias_pesquisadas()
+    if travas is None:
+        processar_linha(automacao, data_handler, idx, retentativas, sessao)
+    else:
+        with travas.trava(data_handler.linhas[idx].guia_cod):
+            processar_linha(automacao, data_handler, idx, retentativas, sessao)
+    return True
+
+
+def descobrir_pela_listagem(automacao, fila, args):
+    """Resolve pela listagem em lote as linhas de guias já confirmadas; retorna a fila com as linhas restantes."""
+    data_final = args.listar_ate or time.strftime('%d/%m/%Y')
+    listagem = ListagemGuias(automacao)
+    try:
+        guias = listagem.listar(args.listar_de, data_final, args.prestador)
+        nova_fila = aplicar_listagem(automacao, guias, fila)
+    except Exception as e:
+        error_message = getattr(e, 'msg', str(e))
+        logging.error(f"Erro na listagem em lote, todas as linhas serão pesquisadas uma a uma: {error_message}")
+        nova_fila = fila
+    else:
+        automacao.data_handler.save()
+        if automacao.metricas is not None:
+            automacao.metricas.linhas_resolvidas_na_listagem(len(fila) - len(nova_fila))
+
+    # As linhas resolvidas já foram gravadas: uma falha daqui em diante não as devolve para a fila
+    try:
+        # Volta a tela de Localizar Procedimentos ao estado inicial para a pesquisa por guia
+        listagem.limpar_filtros(args.prestador)
+        automacao.localizar_procedimentos()
+    except Exception as e:
+        error_message = getattr(e, 'msg', str(e))
+        logging.error(f"Erro ao limpar os filtros da listagem antes da pesquisa por guia: {error_message}")
+    return nova_fila
+
+
+def finalizar_sessao(automacao, relatorio_rede):
+    """Grava os relatórios da sessão (rede, se houver, e localizadores) e fecha o navegador."""
+    automacao.localizadores.relatorio()
+    automacao.carteirinhas.relatorio()
+    if automacao.captura_rede:
+        # Lê as últimas requisições antes de fechar o navegador
+        automacao.marcar_etapa(None)
+        automacao.captura_rede.salvar_relatorio(relatorio_rede)
+    # Feche o WebDriver após a execução
+    automacao.driver.quit()
+
+
+def executar_sessao(numero, fila, criar_automacao, data_handler, controlador, retentativas, relatorio_rede, travas):
+    """
+    Sessão do navegador que consome a fila compartilhada enquanto o controlador lhe der vaga.
+    Cada item da fila é uma guia com suas linhas, processadas em ordem por esta sessão.
+    """
+    automacao = criar_automacao()
+    try:
+        automacao.acessar_portal_ipasgo()
+        while not fila.empty() or not retentativas.esgotada():
+            if not controlador.tem_vaga(numero):
+                # Sessão pausada pelo controlador; o navegador continua logado
+                time.sleep(2)
+                continue
+            try:
+                guia, linhas_guia = fila.get_nowait()
+            except queue.Empty:
+                # Sem guias novas a sessão está ociosa e atende as retentativas
+                if not processar_retentativa(automacao, data_handler, retentativas, numero + 1, travas):
+                    time.sleep(1)
+                continue
+            # Os procedimentos de uma guia são confirmados um por linha, em ordem, numa única sessão
+            with travas.trava(guia):
+                for idx in linhas_guia:
+                    processar_linha(automacao, data_handler, idx, retentativas, numero + 1)
+    except Exception as e:
+        logging.error(f"Sessão {numero + 1} encerrada por erro: {e}")
+    finally:
+        finalizar_sessao(automacao, relatorio_rede)
+
+
+def executar(args):
+    """Processa as linhas do intervalo e do shard escolhidos."""
+    indice_shard, total_shards = args.shard
+    saida = args.saida or args.planilha
+    estado_path = args.estado or str(Path(saida).with_name(Path(saida).stem + '.estado.pkl'))
 
     # Crie uma instância de DataHandler
-    data_handler = DataHandler(file_path, sheet_name)
+    data_handler = DataHandler(args.planilha, args.aba, saida, args.checkpoint_linhas, args.checkpoint_segundos)
 
-    # Crie uma instância de VerificationIPASGO, passando o data_handler
-    automacao = VerificationIPASGO(data_handler)
+    # Compara com a execução anterior: só linhas novas, alteradas, pendentes ou com erro entram na fila
+    diferencial = DiferencialExecucao(estado_path)
+    linhas_pendentes = set(diferencial.planejar(data_handler))
+    linhas_pendentes &= linhas_do_shard(data_handler.df, indice_shard, total_shards)
+    data_handler.save()
 
-    # Defina o intervalo de linhas que deseja processar (números de linhas do Excel, incluindo o cabeçalho)
-    start_line = 2 # Por exemplo, para começar na linha 508 do Excel
-    end_line = len(data_handler.df) + 1  # Até a linha 509 do Excel
+    # Intervalo de linhas do Excel (incluindo o cabeçalho), convertido para índices do pandas
+    start_idx = args.linha_inicial - 2
+    end_idx = (args.linha_final or len(data_handler.df) + 1) - 2
 
-    # Converter números de linha do Excel para índices do pandas
-    start_idx = start_line - 2  # Subtraia 2 para alinhar com o índice do pandas
-    end_idx = end_line - 2
+    # Linhas planejadas, na ordem em que serão processadas
+    fila = [idx for idx in range(start_idx, end_idx + 1) if idx in linhas_pendentes]
+    logging.info(f"Shard {indice_shard}/{total_shards}: {len(fila)} linhas na fila.")
 
-    try:
-        # Faça o login apenas uma vez
-        automacao.acessar_portal_ipasgo()
+    registro = RegistroConfirmacoes(args.registro)
+    limitador = LimitadorTaxa(args.taxa) if args.taxa else None
+    retentativas = FilaRetentativas(args.max_tentativas, args.espera_retentativa)
 
-        # Itere sobre as linhas e processe cada uma
-        for idx in range(start_idx, end_idx):
-            automacao.row_index = idx
-            excel_line_number = idx + 2  # Para correspondência com a linha do Excel
-            logging.info(f"Iniciando o processamento da linha {excel_line_number}")
+    metricas = None
+    if args.metricas_porta:
+        metricas = Metricas()
+        metricas.iniciar(len(fila), end_idx - start_idx + 1 - len(fila))
+        metricas.servir(args.metricas_porta)
 
-            try:
-                automacao.executar_fluxo_para_linha()
-                # Salve as alterações após processar cada linha
-                data_handler.save()
-            except Exception as e:
-                error_message = getattr(e, 'msg', str(e))
-                logging.error(f"Erro ao processar a linha {excel_line_number}: {error_message}")
-                # Atualiza a coluna 'ERRO' no Excel
-                data_handler.update_value(idx, 'ERRO', error_message)
-                data_handler.save()
-                # Continue para a próxima linha
+    try:
+        if args.sessoes_max > 1:
+            executar_varias_sessoes(args, fila, data_handler, registro, limitador, retentativas, metricas)
+            return
 
+        # Crie uma instância de VerificationIPASGO, passando o data_handler
+        automacao = VerificationIPASGO(
+            data_handler, registro, args.pipeline, bool(args.captura_rede), args.snapshots_erro, limitador, None, metricas
+        )
+        try:
+            # Faça o login apenas uma vez
+            automacao.acessar_portal_ipasgo()
+
+            if args.listar_de:
+                fila = descobrir_pela_listagem(automacao, fila, args)
+
+            # Itere sobre as linhas e processe cada uma
+            for posicao, idx in enumerate(fila):
+                automacao.proxima_linha = fila[posicao + 1] if posicao + 1 < len(fila) else None
+                processar_linha(automacao, data_handler, idx, retentativas)
+
+            # Depois da passada principal, as linhas com erro são tentadas de novo conforme a espera de cada uma
+            while not retentativas.esgotada():
+                if not processar_retentativa(automacao, data_handler, retentativas):
+                    time.sleep(min(retentativas.tempo_ate_proxima() or 1, 5))
+        finally:
+            finalizar_sessao(automacao, args.captura_rede)
     finally:
-        # Feche o WebDriver após a execução
-        automacao.driver.quit()
+        retentativas.resumo()
+        registro.fechar()
+        # Grava as linhas processadas depois do último checkpoint
+        data_handler.save()
+        diferencial.salvar_estado(data_handler)
+
+
+def executar_varias_sessoes(args, linhas, data_handler, registro, limitador, retentativas, metricas=None):
+    """Processa a fila com várias sessões do navegador, abertas e pausadas conforme o controlador AIMD."""
+    if args.pipeline:
+        logging.warning("O modo pipeline não é usado com várias sessões.")
+    controlador = ControladorAIMD(args.sessoes_max, args.sessoes_iniciais, limitador=limitador)
+
+    def criar_automacao():
+        return VerificationIPASGO(
+            data_handler, registro, False, bool(args.captura_rede), args.snapshots_erro, limitador, controlador, metricas
+        )
+
+    if args.listar_de:
+        # A listagem roda antes, numa sessão própria, para que só as linhas restantes sejam distribuídas
+        automacao = VerificationIPASGO(data_handler, registro, False, False, args.snapshots_erro, limitador, None, metricas)
+        try:
+            automacao.acessar_portal_ipasgo()
+            linhas = descobrir_pela_listagem(automacao, linhas, args)
+        finally:
+            automacao.driver.quit()
+
+    # Normaliza as colunas do modelo antes de abrir as sessões, em vez de na primeira linha de cada uma
+    data_handler.linhas.preparar_colunas()
+    # Um item por guia, com as linhas dela na ordem da planilha, como os shards (linhas_do_shard)
+    linhas_por_guia = {}
+    for idx in linhas:
+        linhas_por_guia.setdefault(data_handler.linhas[idx].guia_cod, []).append(idx)
+    fila = queue.Queue()
+    for item in linhas_por_guia.items():
+        fila.put(item)
+    travas = TravasPorChave()
+
+    def relatorio_rede(numero):
+        if not args.captura_rede:
+            return None
+        caminho = Path(args.captura_rede)
+        return str(caminho.with_name(f"{caminho.stem}.sessao{numero + 1}{caminho.suffix}"))
+
+    sessoes = []
+    while not fila.empty() or any(sessao.is_alive() for sessao in sessoes):
+        # Abre novas sessões quando o controlador aumenta a concorrência
+        while len(sessoes) < controlador.sessoes_ativas and not fila.empty():
+            numero = len(sessoes)
+            sessao = threading.Thread(
+                target=executar_sessao,
+                args=(numero, fila, criar_automacao, data_handler, controlador, retentativas, relatorio_rede(numero), travas),
+                name=f"sessao-{numero + 1}",
+            )
+            sessao.start()
+            sessoes.append(sessao)
+            logging.info(f"Sessão {numero + 1} iniciada ({controlador.sessoes_ativas} ativas de no máximo {args.sessoes_max}).")
+        if not any(sessao.is_alive() for sessao in sessoes) and not fila.empty():
+            logging.error(f"Todas as sessões foram encerradas com {fila.qsize()} guias ainda na fila.")
+            break
+        if metricas is not None:
+            metricas.definir('ipasgo_sessoes_ativas', sum(1 for sessao in sessoes if sessao.is_alive()))
+        time.sleep(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Automação de verificação de consultas IPASGO.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    parser_executar = sub.add_parser('executar', help="Processa as linhas da planilha no portal.")
+    parser_executar.add_argument('--planilha', default=PLANILHA_PADRAO, help="Planilha de entrada (.xlsx).")
+    parser_executar.add_argument('--aba', default='Planilha1', help="Nome da aba da planilha.")
+    parser_executar.add_argument('--saida', help="Planilha onde os resultados são salvos (padrão: a própria entrada).")
+    parser_executar.add_argument('--registro', default=REGISTRO_PATH_PADRAO, help="Registro de confirmações (.jsonl).")
+    parser_executar.add_argument('--estado', help="Estado do modo diferencial (padrão: ao lado da saída).")
+    parser_executar.add_argument('--linha-inicial', type=int, default=2, help="Primeira linha do Excel a processar.")
+    parser_executar.add_argument('--linha-final', type=int, help="Última linha do Excel a processar (inclusive).")
+    parser_executar.add_argument('--shard', type=parse_shard, default='1/1',
+                                 help="Parte i/n das guias a processar, particionada pelo GUIA_COD.")
+    parser_executar.add_argument('--pipeline', action='store_true', help="Pesquisa a próxima guia numa segunda aba.")
+    parser_executar.add_argument('--listar-de', metavar='DD/MM/AAAA',
+                                 help="Lista em lote as guias do período antes de pesquisar uma a uma.")
+    parser_executar.add_argument('--listar-ate', metavar='DD/MM/AAAA', help="Fim do período da listagem (padrão: hoje).")
+    parser_executar.add_argument('--prestador', help="Prestador a filtrar na listagem em lote.")
+    parser_executar.add_argument('--sessoes-max', type=int, default=1, help="Máximo de sessões do navegador em paralelo.")
+    parser_executar.add_argument('--sessoes-iniciais', type=int, default=1, help="Sessões ativas no início (controlador AIMD).")
+    parser_executar.add_argument('--taxa', type=float, help="Limite de ações no portal por segundo, somando todas as sessões.")
+    parser_executar.add_argument('--max-tentativas', type=int, default=3,
+                                 help="Tentativas por linha, incluindo a da passada principal (1 desativa as retentativas).")
+    parser_executar.add_argument('--espera-retentativa', type=float, default=30,
+                                 help="Espera em segundos antes da primeira retentativa; dobra a cada nova falha.")
+    parser_executar.add_argument('--checkpoint-linhas', type=int, default=CHECKPOINT_LINHAS,
+                                 help="Salva a planilha a cada tantas linhas processadas.")
+    parser_executar.add_argument('--checkpoint-segundos', type=float, default=CHECKPOINT_SEGUNDOS,
+                                 help="Salva a planilha se passou este tempo desde o último save, mesmo com menos linhas.")
+    parser_executar.add_argument('--metricas-porta', type=int, metavar='PORTA',
+                                 help="Expõe métricas no formato do Prometheus em http://127.0.0.1:PORTA/metrics.")
+    parser_executar.add_argument('--snapshots-erro', metavar='PASTA', help="Grava nesta pasta os últimos snapshots do DOM quando uma etapa falha.")
+    parser_executar.add_argument('--captura-rede', metavar='RELATORIO', help="Captura as XHRs por etapa e grava o relatório JSON.")
+
+    parser_mesclar = sub.add_parser('mesclar', help="Copia os resultados das planilhas dos shards para a mestre.")
+    parser_mesclar.add_argument('--planilha', default=PLANILHA_PADRAO, help="Planilha mestre (.xlsx).")
+    parser_mesclar.add_argument('--aba', default='Planilha1', help="Nome da aba da planilha.")
+    parser_mesclar.add_argument('saidas', nargs='+', help="Planilhas de saída dos shards.")
+
+    args = parser.parse_args(argv)
+    if args.comando == 'executar':
+        executar(args)
+    elif args.comando == 'mesclar':
+        mesclar_resultados(args.planilha, args.saidas, args.aba)
+
+
+if __name__ == "__main__":
+    main()